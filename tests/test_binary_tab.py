@@ -0,0 +1,71 @@
+"""Unit tests for the binary tab container."""
+
+import json
+import os
+import tempfile
+import unittest
+
+import pretty_midi
+
+from tuttut.logic.binary_tab import BinaryTab, write_binary_tab
+from tuttut.logic.tab import Tab
+from tuttut.logic.theory import Tuning
+
+
+def _make_tab(tuning=None):
+    """Build a Tab spanning a few measures, with chords and a time signature change."""
+    midi = pretty_midi.PrettyMIDI()
+    instrument = pretty_midi.Instrument(program=25)
+    for i in range(24):
+        for pitch in ((48, 55, 64) if i % 4 == 0 else (40 + (i * 7) % 30,)):
+            instrument.notes.append(pretty_midi.Note(velocity=80, pitch=pitch, start=i * 0.5, end=i * 0.5 + 0.4))
+    midi.instruments.append(instrument)
+    midi.time_signature_changes = [pretty_midi.TimeSignature(4, 4, 0.0), pretty_midi.TimeSignature(3, 4, 6.0)]
+    return Tab("test", tuning or Tuning(), midi)
+
+
+class TestBinaryTab(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "test.tut")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        tab = _make_tab()
+        tab.to_binary(self.path)
+
+        binary = BinaryTab(self.path)
+        self.assertEqual(len(binary), len(tab.tab["measures"]))
+        self.assertEqual(binary.to_dict(), tab.tab)
+
+    def test_slice_measures(self):
+        tab = _make_tab(Tuning(Tuning.standard_ukulele_tuning))
+        with open(self.path, "wb") as file:
+            write_binary_tab(file, tab.tab)
+
+        binary = BinaryTab(self.path)
+        self.assertEqual(binary[2:5], tab.tab["measures"][2:5])
+        self.assertEqual(binary[-1], tab.tab["measures"][-1])
+        with self.assertRaises(IndexError):
+            binary[len(binary)]
+
+        strings, frets, offsets = binary.get_measure_positions(2, 5)
+        notes = [note for measure in tab.tab["measures"][2:5] for event in measure["events"] for note in event.get("notes", [])]
+        self.assertEqual(strings.tolist(), [note["string"] for note in notes])
+        self.assertEqual(frets.tolist(), [note["fret"] for note in notes])
+        self.assertEqual(offsets[-1], len(notes))
+
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as file:
+            file.write(b"not a tab" * 10)
+
+        with self.assertRaises(ValueError):
+            BinaryTab(self.path)
+
+    def test_smaller_than_json(self):
+        tab = _make_tab()
+        tab.to_binary(self.path)
+
+        self.assertLess(os.path.getsize(self.path), len(json.dumps(tab.tab)) / 2)
@@ -0,0 +1,154 @@
+"""Unit tests for the persistent fingering store."""
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import pretty_midi
+
+from tuttut.logic import fingering_store
+from tuttut.logic.fingering_store import FingeringCache, FingeringStore
+from tuttut.logic.fretboard import Fretboard
+from tuttut.logic.tab import Tab
+from tuttut.logic.theory import Note, Tuning
+
+
+class TestFingeringStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "fingerings.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        store = FingeringStore(self.path)
+        fingerings = [((0, 0), (1, 5)), ((1, 5), (2, 9))]
+        store.put("tuning", (59, 64), fingerings)
+
+        self.assertEqual(store.get("tuning", (59, 64)), fingerings)
+        self.assertIsNone(store.get("tuning", (60, 64)))
+        self.assertIsNone(store.get("other tuning", (59, 64)))
+        self.assertEqual(len(store), 1)
+        store.close()
+
+    def test_empty_fingering_list_is_stored(self):
+        store = FingeringStore(self.path)
+        store.put("tuning", (40, 41, 42), [])
+
+        self.assertEqual(store.get("tuning", (40, 41, 42)), [])
+        store.close()
+
+    def test_version_change_invalidates_store(self):
+        store = FingeringStore(self.path)
+        store.put("tuning", (64,), [((0, 0),)])
+        store.close()
+
+        with mock.patch.object(fingering_store, "FINGERING_STORE_VERSION", fingering_store.FINGERING_STORE_VERSION + 1):
+            store = FingeringStore(self.path)
+            self.assertIsNone(store.get("tuning", (64,)))
+            store.close()
+
+    def test_fretboards_share_stored_fingerings(self):
+        store = FingeringStore(self.path)
+        chord = [Note(48), Note(52), Note(55), Note(60), Note(64)]
+
+        first = Fretboard(Tuning(), store=store, cache=FingeringCache())
+        expected = [tuple(first.positions[n] for n in f) for f in first.get_possible_fingerings(first.get_note_options(chord))]
+
+        # A fresh fretboard for the same tuning reads the chord back instead of enumerating it
+        second = Fretboard(Tuning(), store=store, cache=FingeringCache())
+        with mock.patch.object(Fretboard, "_enumerate_fingerings", side_effect=AssertionError):
+            fingerings = second.get_possible_fingerings(second.get_note_options(chord))
+        self.assertEqual([tuple(second.positions[n] for n in f) for f in fingerings], expected)
+
+        # A different tuning has its own fingerprint
+        self.assertNotEqual(Fretboard(Tuning(Tuning.standard_ukulele_tuning)).fingerprint, first.fingerprint)
+        store.close()
+
+    def test_puts_are_written_in_batches(self):
+        store = FingeringStore(self.path, flush_size=3)
+        reader = FingeringStore(self.path)
+        chords = [(pitch,) for pitch in range(60, 65)]
+        for chord in chords:
+            store.put("tuning", chord, [((0, chord[0] - 40),)])
+
+        # One batch written, the other chords are pending but readable from the writing store
+        self.assertEqual(len(reader), 3)
+        self.assertEqual(store.get("tuning", (64,)), [((0, 24),)])
+        self.assertIsNone(reader.get("tuning", (64,)))
+
+        store.close()
+        self.assertEqual([reader.get("tuning", chord) for chord in chords], [[((0, chord[0] - 40),)] for chord in chords])
+        reader.close()
+
+    def test_tab_fills_store_across_chords(self):
+        midi = pretty_midi.PrettyMIDI()
+        instrument = pretty_midi.Instrument(program=25)
+        for i, pitches in enumerate([(48, 55, 64), (50, 57, 62), (52, 59, 64), (53, 57, 60)]):
+            for pitch in pitches:
+                instrument.notes.append(pretty_midi.Note(velocity=80, pitch=pitch, start=i * 0.5, end=i * 0.5 + 0.4))
+        midi.instruments.append(instrument)
+
+        store = FingeringStore(self.path)
+        with mock.patch("tuttut.logic.fretboard.shared_fingering_cache", FingeringCache()):
+            Tab("test", Tuning(), midi, fingering_store=store)
+
+        # Written once the observations are built, without closing the store
+        reader = FingeringStore(self.path)
+        self.assertGreaterEqual(len(reader), 4)
+        reader.close()
+        store.close()
+
+
+
+class TestFingeringCache(unittest.TestCase):
+    def test_lru_eviction_by_size(self):
+        cache = FingeringCache(maxsize=4)
+        cache.put("tuning", (60,), [((0, 1),), ((1, 5),)])
+        cache.put("tuning", (62,), [((0, 3),)])
+        self.assertIsNotNone(cache.get("tuning", (60,)))  # (60,) is now the most recently used
+
+        cache.put("tuning", (64,), [((0, 0),), ((1, 5),)])
+        self.assertIsNone(cache.get("tuning", (62,)))
+        self.assertIsNotNone(cache.get("tuning", (60,)))
+        self.assertEqual(cache.size, 4)
+        self.assertEqual(cache.counters, {"hits": 2, "misses": 1, "evictions": 1})
+
+    def test_thread_safe_puts(self):
+        cache = FingeringCache(maxsize=50)
+
+        def fill(offset):
+            for pitch in range(100):
+                cache.put("tuning", (offset + pitch,), [((0, 0),)])
+                cache.get("tuning", (offset + pitch,))
+
+        threads = [threading.Thread(target=fill, args=(i * 1000,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(cache), 50)
+        self.assertEqual(cache.size, 50)
+        self.assertEqual(cache.counters["evictions"], 350)
+
+    def test_fretboards_share_cache(self):
+        cache = FingeringCache()
+        chord = [Note(64), Note(59)]
+
+        first = Fretboard(Tuning(), cache=cache)
+        first.get_possible_fingerings(first.get_note_options(chord))
+        self.assertEqual(cache.counters["misses"], 1)
+
+        second = Fretboard(Tuning(), cache=cache)
+        with mock.patch.object(Fretboard, "_enumerate_fingerings", side_effect=AssertionError):
+            fingerings = second.get_possible_fingerings(second.get_note_options(chord))
+        self.assertEqual(cache.counters["hits"], 1)
+
+        # Fingerings are returned as the second fretboard's own nodes
+        for fingering in fingerings:
+            for note in fingering:
+                self.assertIn(note, second.positions)
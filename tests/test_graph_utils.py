@@ -1,3 +1,4 @@
+import itertools
 import unittest
 import numpy as np
 
@@ -11,6 +12,12 @@ from tuttut.logic.difficulty import (
     get_height_score,
     get_raw_height,
     get_path_length,
+    get_path_span,
+    get_dheight_score,
+    precompute_fingering_stats,
+    compute_isolated_difficulties,
+    select_easiest_fingerings,
+    get_fingering_coordinates,
 )
 from tuttut.logic.theory import Note, Tuning
 from tuttut.logic.fretboard import Fretboard
@@ -134,6 +141,21 @@ class TestGraphUtils(unittest.TestCase):
         s1f15 = by_pos[(1, 15)]
         self.assertFalse(is_edge(self.s0f1, s1f15))
 
+    def test_distance_table(self):
+        fb = self.fretboard
+        for note in fb.nodes[::7]:
+            for target in fb.nodes:
+                distance = graph_utils._distance_between(self.positions[note], self.positions[target], self.tuning.nstrings)
+                source_id, target_id = fb.node_ids[note], fb.node_ids[target]
+                self.assertAlmostEqual(fb.distance_table[source_id, target_id], distance)
+                self.assertEqual(
+                    fb.edge_table[source_id, target_id],
+                    graph_utils.is_edge_possible(note, target, self.positions, distance),
+                )
+
+        # Computed once per tuning
+        self.assertIs(Fretboard(Tuning()).distance_table, fb.distance_table)
+
     def test_is_path_already_checked(self):
         path_a = (self.s0f1, self.s1f1)
         path_b = (self.s1f1, self.s0f1)   # same Note instances, reversed
@@ -213,6 +235,19 @@ class TestGraphUtils(unittest.TestCase):
         diff_high = compute_isolated_path_difficulty(self.positions, (self.s0f10,), self.tuning)
         self.assertLess(diff_low, diff_high)
 
+    def test_compute_isolated_difficulties(self):
+        fingerings = self.fretboard.get_possible_fingerings(self.fretboard.get_note_options([Note(48), Note(52), Note(55)]))
+        stats = precompute_fingering_stats(self.positions, fingerings, self.tuning)
+        expected = [compute_isolated_path_difficulty(self.positions, f, self.tuning) for f in fingerings]
+        np.testing.assert_allclose(compute_isolated_difficulties(stats), expected)
+
+    def test_select_easiest_fingerings(self):
+        difficulties = np.array([3.0, 1.0, 2.0, 1.5, 1.0])
+        np.testing.assert_array_equal(select_easiest_fingerings(difficulties), [0, 1, 2, 3, 4])
+        np.testing.assert_array_equal(select_easiest_fingerings(difficulties, top_k=3), [1, 3, 4])
+        np.testing.assert_array_equal(select_easiest_fingerings(difficulties, max_cost_ratio=1.5), [1, 3, 4])
+        np.testing.assert_array_equal(select_easiest_fingerings(difficulties, top_k=1, max_cost_ratio=2), [1])
+
     def test_compute_path_difficulty(self):
         path = (self.s0f1, self.s1f1)
         diff = compute_path_difficulty(self.positions, path, path, self.weights, self.tuning)
@@ -253,6 +288,225 @@ class TestGraphUtils(unittest.TestCase):
             self.assertAlmostEqual(float(np.sum(row)), 1.0)
         self.assertTrue(np.all(Tm >= 0))
 
+    def test_build_transition_matrix_matches_pairwise_difficulty(self):
+        fingerings = [
+            (self.s0f1,), (self.s0f0,), (self.s0f5, self.s1f5), (self.s0f0, self.s1f1),
+            (self.s5f0, self.s1f0), (self.s0f10,), (self.s5f5, self.s0f2),
+        ]
+        Tm = graph_utils.build_transition_matrix(self.positions, fingerings, self.weights, self.tuning)
+
+        def pair_easiness(curr, prev):
+            prev_rh = get_raw_height(self.positions, prev)
+            curr_rh = get_raw_height(self.positions, curr, prev)
+            return (
+                laplace_distro(get_dheight_score(curr_rh, prev_rh, self.tuning), b=self.weights["b"])
+                / (1 + get_height_score(get_raw_height(self.positions, curr), self.tuning))
+                / (1 + get_path_span(self.positions, curr))
+                / (1 + get_n_changed_strings(self.positions, curr, prev, self.tuning))
+            )
+
+        easiness = np.array([[pair_easiness(curr, prev) for curr in fingerings] for prev in fingerings])
+        np.testing.assert_allclose(Tm, easiness / easiness.sum(axis=1, keepdims=True))
+
+    def test_transition_provider_blocks(self):
+        fingerings = [(self.s0f1,), (self.s0f5,), (self.s1f1,), (self.s5f5,), (self.s0f10,)]
+        chord_states = [np.array([0, 1]), np.array([2, 3, 4])]
+        provider = graph_utils.TransitionProvider(
+            precompute_fingering_stats(self.positions, fingerings, self.tuning), chord_states, self.weights, self.tuning
+        )
+
+        block = provider.block(0, 1)
+        self.assertEqual(block.shape, (2, 3))
+
+        # Block rows are the dense rows, normalised over the whole vocabulary, restricted to the next chord
+        Tm = graph_utils.build_transition_matrix(self.positions, fingerings, self.weights, self.tuning)
+        np.testing.assert_allclose(block, Tm[np.ix_([0, 1], [2, 3, 4])])
+        np.testing.assert_allclose(provider.block(1, 0), Tm[np.ix_([2, 3, 4], [0, 1])])
+        self.assertEqual(provider.counters["row_totals_computed"], 5)
+
+        # Blocks are memoized and only requested pairs are computed
+        self.assertIs(provider.block(0, 1), block)
+        self.assertEqual(provider.counters["blocks_computed"], 2)
+        self.assertEqual(provider.counters["block_hits"], 1)
+        self.assertEqual(provider.counters["cells_computed"], 12)
+        self.assertEqual(provider.counters["row_total_cells_computed"], 5 * 5)
+        self.assertEqual(provider.cells_skipped, 25 - 12 - 25)
+
+        # A previous state of one chord only: its row total spans the vocabulary, but nothing else is computed
+        partial = graph_utils.TransitionProvider(
+            precompute_fingering_stats(self.positions, fingerings, self.tuning), chord_states, self.weights, self.tuning
+        )
+        partial.block(0, 1, rows=np.array([0]))
+        self.assertEqual(partial.counters["row_total_cells_computed"], 5)
+        self.assertEqual(partial.cells_skipped, 25 - 3 - 5)
+
+    def test_collapse_equivalent_fingerings(self):
+        by_pos = {v: k for k, v in self.positions.items()}
+        fingerings = [
+            (by_pos[(0, 1)], by_pos[(1, 3)]),  # same shape features as the next one
+            (by_pos[(0, 3)], by_pos[(1, 1)]),
+            (by_pos[(0, 5)], by_pos[(1, 5)]),
+            (self.s0f10,), (self.s1f1,), (self.s5f5,),
+        ]
+        stats = precompute_fingering_stats(self.positions, fingerings, self.tuning)
+        chord_states = [np.array([0, 1, 2]), np.array([3, 4, 5])]
+
+        class_states, class_counts = graph_utils.collapse_equivalent_fingerings(stats, chord_states)
+        self.assertEqual([list(c) for c in class_states], [[0, 2], [3, 4, 5]])
+        self.assertEqual([list(c) for c in class_counts], [[2, 1], [1, 1, 1]])
+
+        full = graph_utils.TransitionProvider(stats, chord_states, self.weights, self.tuning)
+        collapsed = graph_utils.TransitionProvider(stats, class_states, self.weights, self.tuning, class_counts)
+        np.testing.assert_allclose(collapsed.block(1, 0), full.block(1, 0)[:, [0, 2]])
+        np.testing.assert_allclose(collapsed.block(0, 1), full.block(0, 1)[[0, 2]])
+
+        V = [0, 1, 0, 0, 1, 1, 0]
+        initial = np.array([0.25, 0.25, 0.5, 0, 0, 0])
+        self.assertEqual(
+            list(graph_utils.decode_chord_sequence(V, class_states, collapsed, initial)),
+            list(graph_utils.decode_chord_sequence(V, chord_states, full, initial)),
+        )
+
+    def test_decode_chord_sequence(self):
+        fingerings = [(self.s0f1,), (self.s0f10,), (self.s1f1,), (self.s5f5,)]
+        chord_states = [np.array([0, 1]), np.array([2, 3])]
+        provider = graph_utils.TransitionProvider(
+            precompute_fingering_stats(self.positions, fingerings, self.tuning), chord_states, self.weights, self.tuning
+        )
+
+        result = graph_utils.decode_chord_sequence([0, 1, 0], chord_states, provider, np.array([0.5, 0.5, 0, 0]))
+        self.assertEqual(len(result), 3)
+        self.assertIn(result[0], chord_states[0])
+        self.assertIn(result[1], chord_states[1])
+        self.assertIn(result[2], chord_states[0])
+        self.assertEqual(provider.counters["blocks_computed"], 2)
+
+    def _random_chord_problem(self, seed, sizes, length):
+        rng = np.random.default_rng(seed)
+        by_pos = {v: k for k, v in self.positions.items()}
+        fingerings = [(by_pos[(int(rng.integers(0, 6)), int(rng.integers(0, 21)))],) for _ in range(sum(sizes))]
+        bounds = np.cumsum([0] + sizes)
+        chord_states = [np.arange(bounds[i], bounds[i + 1]) for i in range(len(sizes))]
+        provider = graph_utils.TransitionProvider(
+            precompute_fingering_stats(self.positions, fingerings, self.tuning), chord_states, self.weights, self.tuning
+        )
+        V = [int(v) for v in rng.integers(0, len(sizes), length)]
+        initial = np.zeros(len(fingerings))
+        initial[chord_states[V[0]]] = 1 / len(chord_states[V[0]])
+        return V, chord_states, provider, initial
+
+    def test_stream_chord_sequence_matches_exact_decode_with_full_lag(self):
+        V, chord_states, provider, initial = self._random_chord_problem(1, [3, 5, 2, 4], 40)
+        expected = graph_utils.decode_chord_sequence(V, chord_states, provider, initial)
+
+        streamed = list(graph_utils.stream_chord_sequence(iter(V), chord_states, provider, initial, lag=len(V)))
+        self.assertEqual(streamed, list(expected))
+
+    def test_stream_chord_sequence_bounded_lag(self):
+        V, chord_states, provider, initial = self._random_chord_problem(2, [3, 5, 2, 4], 60)
+
+        decoder = graph_utils.FixedLagViterbi(lag=3)
+        committed = []
+        previous = None
+        for chord in V:
+            with np.errstate(divide="ignore"):
+                scores = np.log(initial[chord_states[chord]]) if previous is None else np.log(provider.block(previous, chord))
+            committed += decoder.push(chord_states[chord], scores)
+            previous = chord
+            # Never more than lag + 1 steps pending
+            self.assertLessEqual(len(committed), len(V))
+            self.assertLessEqual(decoder._paths.shape[1], 4)
+        committed += decoder.flush()
+
+        self.assertEqual(len(committed), len(V))
+        for state, chord in zip(committed, V):
+            self.assertIn(state, chord_states[chord])
+
+    def test_decode_chord_segments(self):
+        V, chord_states, provider, initial = self._random_chord_problem(3, [3, 5, 2, 4], 60)
+        stats = provider._stats
+        exact = graph_utils.decode_chord_sequence(V, chord_states, provider, initial)
+
+        # No usable anchor → plain exact decode
+        unsplit = graph_utils.decode_chord_segments(V, chord_states, stats, self.weights, self.tuning, initial, anchors=[])
+        self.assertEqual(list(unsplit), list(exact))
+
+        result = graph_utils.decode_chord_segments(
+            V, chord_states, stats, self.weights, self.tuning, initial,
+            anchors=[5, 20, 40], overlap=3, min_segment_length=10, max_workers=2,
+        )
+        self.assertEqual(len(result), len(V))
+        for state, chord in zip(result, V):
+            self.assertIn(state, chord_states[chord])
+
+    def test_beam_decoder(self):
+        V, chord_states, provider, initial = self._random_chord_problem(4, [3, 5, 2, 4], 40)
+        exact = graph_utils.decode_chord_sequence(V, chord_states, provider, initial)
+
+        # A beam as wide as the largest chord is exact
+        wide = graph_utils.decode_chord_sequence(V, chord_states, provider, initial, "beam", beam_width=5)
+        self.assertEqual(list(wide), list(exact))
+
+        narrow = graph_utils.decode_chord_sequence(V, chord_states, provider, initial, "beam", beam_width=1)
+        for state, chord in zip(narrow, V):
+            self.assertIn(state, chord_states[chord])
+
+        # Only the beam rows of each block are computed
+        _, _, fresh, _ = self._random_chord_problem(4, [3, 5, 2, 4], 40)
+        self.assertEqual(list(graph_utils.decode_chord_sequence(V, chord_states, fresh, initial, "beam", beam_width=1)), list(narrow))
+        self.assertEqual(fresh.counters["blocks_computed"], 0)
+        self.assertEqual(fresh.counters["cells_computed"], sum(len(chord_states[chord]) for chord in V[1:]))
+        np.testing.assert_allclose(fresh.block(0, 1, rows=np.array([2, 0])), provider.block(0, 1)[[2, 0]])
+
+        report = graph_utils.beam_search_gap(V, chord_states, provider, initial, beam_width=1)
+        self.assertGreaterEqual(report["gap"], 0)
+        self.assertAlmostEqual(report["viterbi_score"] - report["beam_score"], report["gap"])
+        self.assertEqual(graph_utils.beam_search_gap(V, chord_states, provider, initial, beam_width=5)["gap"], 0)
+
+        with self.assertRaises(ValueError):
+            graph_utils.decode_chord_sequence(V, chord_states, provider, initial, "greedy")
+
+    def test_compact_decoder_buffers(self):
+        V, chord_states, provider, initial = self._random_chord_problem(5, [3, 5, 2, 4], 40)
+        exact = graph_utils.decode_chord_sequence(V, chord_states, provider, initial)
+
+        full_report, compact_report = {}, {}
+        graph_utils.decode_chord_sequence(V, chord_states, provider, initial, report=full_report)
+        compact = graph_utils.decode_chord_sequence(
+            V, chord_states, provider, initial, dtype=np.float32, report=compact_report
+        )
+        self.assertEqual(list(compact), list(exact))
+
+        # float32 scores, uint8 backpointers (at most 5 states per chord)
+        self.assertEqual(compact_report["omega"] * 2, full_report["omega"])
+        self.assertEqual(compact_report["scores"] * 2, full_report["scores"])
+        self.assertEqual(compact_report["prev"], sum(len(chord_states[v]) for v in V[1:]))
+
+        beam_report = {}
+        graph_utils.decode_chord_sequence(V, chord_states, provider, initial, "beam", 2, np.float32, beam_report)
+        self.assertEqual(beam_report["prev"], 2 * (len(V) - 1))
+
+        # Segment-parallel and streaming decoders use the same buffer types
+        segment_report = {}
+        segments = graph_utils.decode_chord_segments(
+            V, chord_states, provider._stats, self.weights, self.tuning, initial, anchors=[20], overlap=3,
+            min_segment_length=10, max_workers=2, dtype=np.float32, report=segment_report,
+        )
+        self.assertEqual(len(segments), len(V))
+        self.assertEqual(segment_report["scores"], 5 * 5 * 4)
+        self.assertEqual(
+            segment_report["prev"],
+            max(sum(len(chord_states[v]) for v in V[1:20]), sum(len(chord_states[v]) for v in V[21:])),
+        )
+
+        stream_report = {}
+        streamed = graph_utils.stream_chord_sequence(V, chord_states, provider, initial, len(V), np.float32, stream_report)
+        self.assertEqual(list(streamed), list(exact))
+        self.assertEqual(stream_report["scores"], 5 * 5 * 4)
+
+        self.assertEqual(graph_utils.backpointer_dtype_for(256), np.uint8)
+        self.assertEqual(graph_utils.backpointer_dtype_for(257), np.uint16)
+
     def test_viterbi(self):
         Tm = np.array([[0.9, 0.1], [0.1, 0.9]])
         Em = np.array([[0.9, 0.1], [0.1, 0.9]])
@@ -264,6 +518,34 @@ class TestGraphUtils(unittest.TestCase):
         self.assertEqual(len(result_single), 1)
         self.assertEqual(result_single[0], 0)
 
+    def test_viterbi_matches_dense_decoder_with_block_emissions(self):
+        rng = np.random.default_rng(0)
+        sizes = [3, 1, 4, 2]
+        Em = np.zeros((sum(sizes), len(sizes)))
+        Em[np.arange(sum(sizes)), np.repeat(np.arange(len(sizes)), sizes)] = 1
+        Tm = rng.random((sum(sizes), sum(sizes)))
+        Tm /= Tm.sum(axis=1, keepdims=True)
+        V = list(rng.integers(0, len(sizes), 30))
+        initial = rng.random(sum(sizes))
+
+        # Reference: full M x M scoring at every step
+        with np.errstate(divide="ignore"):
+            log_Tm, log_Em = np.log(Tm), np.log(Em)
+            omega = np.log(initial) + log_Em[:, V[0]]
+            prev = []
+            for v in V[1:]:
+                scores = omega[:, np.newaxis] + log_Tm + log_Em[:, v]
+                prev.append(np.argmax(scores, axis=0))
+                omega = np.max(scores, axis=0)
+        expected = [int(np.argmax(omega))]
+        for p in reversed(prev):
+            expected.append(int(p[expected[-1]]))
+
+        result = graph_utils.viterbi(V, Tm, Em, initial)
+        self.assertEqual(list(result), expected[::-1])
+        for state, v in zip(result, V):
+            self.assertEqual(Em[state, v], 1)
+
     # -------------------------------------------------------------------------
     # Fretboard fingering logic
     # -------------------------------------------------------------------------
@@ -294,6 +576,86 @@ class TestGraphUtils(unittest.TestCase):
             strings = [self.positions[n][0] for n in f]
             self.assertEqual(len(strings), len(set(strings)))  # no two notes on same string
 
+    def test_fretboard_node_arrays(self):
+        fb = self.fretboard
+        self.assertEqual(len(fb.nodes), self.tuning.nstrings * (self.tuning.nfrets + 1))
+        for node, inode in fb.node_ids.items():
+            self.assertEqual(fb.node_pitch[inode], node.pitch)
+            self.assertEqual((fb.node_string[inode], fb.node_fret[inode]), self.positions[node])
+
+        fingerings = [(self.s0f1, self.s1f5), (self.s5f0,), ()]
+        ids = fb.get_fingering_ids(fingerings)
+        self.assertEqual(ids.shape, (3, 2))
+        self.assertEqual(fb.get_fingerings_from_ids(ids), fingerings)
+
+        strings, frets = get_fingering_coordinates(self.positions, fingerings)
+        self.assertEqual(strings.tolist(), [[0, 1], [5, -1], [-1, -1]])
+        self.assertEqual(frets.tolist(), [[1, 5], [0, -1], [-1, -1]])
+        for array, expected in zip(fb.get_node_coordinates(ids), (strings, frets)):
+            self.assertEqual(array.tolist(), expected.tolist())
+
+    def test_fingering_stats_match_per_fingering_helpers(self):
+        fingerings = [
+            (self.s0f1,), (self.s0f0,), (self.s0f5, self.s1f5), (self.s0f0, self.s1f1),
+            (self.s5f0, self.s1f0), (self.s0f10,), (self.s5f5, self.s0f2),
+        ]
+        stats = precompute_fingering_stats(self.positions, fingerings, self.tuning)
+        for i, f in enumerate(fingerings):
+            self.assertEqual(stats["raw_height"][i], get_raw_height(self.positions, f))
+            self.assertEqual(stats["span_score"][i], get_path_span(self.positions, f))
+            self.assertEqual(stats["n_notes"][i], len(f))
+            self.assertEqual(stats["all_strings"][i], sum(1 << self.positions[n][0] for n in f))
+            self.assertEqual(stats["non_open_strings"][i], sum(1 << self.positions[n][0] for n in f if self.positions[n][1] != 0))
+
+    def test_fingering_enumerator_matches_permutation_search(self):
+        def permutation_search(note_options):
+            seen, fingerings = set(), []
+            for permutation in itertools.permutations(note_options):
+                for path in graph_utils.find_valid_paths(self.positions, permutation, self.tuning.nstrings):
+                    if frozenset(path) not in seen and self.fretboard.is_fingering_possible(path, permutation):
+                        seen.add(frozenset(path))
+                        fingerings.append(path)
+            return fingerings
+
+        chords = [(48, 52, 55), (45, 52, 57, 60), (48, 52, 55, 60, 64), (40, 47, 52, 56, 59, 64), (50, 57, 62, 66)]
+        for chord in chords:
+            note_options = self.fretboard.get_note_options([Note(p) for p in chord])
+            fingerings = self.fretboard.get_possible_fingerings(note_options)
+
+            keys = [frozenset(f) for f in fingerings]
+            self.assertEqual(len(keys), len(set(keys)))  # each fingering exactly once
+            self.assertEqual(set(keys), {frozenset(f) for f in permutation_search(note_options)})
+
+    def test_transposed_chord_shapes_match_full_enumeration(self):
+        rng = np.random.default_rng(0)
+        for tuning in (self.tuning, Tuning(Tuning.standard_ukulele_tuning)):
+            fretboard = Fretboard(tuning)
+            intervals = [(0, 4, 7), (0, 3, 7, 10), (0, 7, 12, 16), (0, 2, 9, 14, 19)]
+            for chord_intervals in intervals:
+                for root in rng.choice(np.arange(36, 80), size=12, replace=False):
+                    notes = [Note(int(root) + interval) for interval in chord_intervals]
+                    note_options = fretboard.get_note_options(notes)
+                    if len(note_options) < 2:
+                        continue
+                    self.assertEqual(
+                        fretboard._compute_fingerings(note_options),
+                        list(fretboard._enumerate_fingerings(note_options)),
+                    )
+
+    def test_reduce_chord(self):
+        cluster = [Note(pitch) for pitch in range(50, 59)]
+        for policy, kept in (("outer", (50, 58)), ("top", (58,)), ("bass", (50,))):
+            notes, fingerings = self.fretboard.reduce_chord(cluster, policy)
+            pitches = [note.pitch for note in notes]
+            self.assertLessEqual(len(notes), self.tuning.nstrings)
+            self.assertTrue(set(kept) <= set(pitches))
+            self.assertGreater(len(fingerings), 0)
+
+        notes, fingerings = self.fretboard.reduce_chord(cluster, None)
+        self.assertEqual((len(notes), fingerings), (len(cluster), []))
+        with self.assertRaises(ValueError):
+            self.fretboard.reduce_chord(cluster, "middle")
+
     def test_fix_impossible_notes(self):
         fretboard = Fretboard(Tuning(["F#1", "E2"]))
         fretboard.tuning.nfrets = 10
@@ -1,7 +1,9 @@
 import unittest
+import numpy as np
 import pretty_midi
 
 from tuttut.logic import midi_utils
+from tuttut.logic.theory import Note
 
 class TestMidiUtils(unittest.TestCase):
     def setUp(self):
@@ -114,4 +116,53 @@ class TestMidiUtils(unittest.TestCase):
         self.assertEqual(midi_utils.round_to_multiple(to_round, base), -5)
         
     def test_quantize(self):
-        pass
\ No newline at end of file
+        pass
+
+    def test_times_to_ticks_matches_time_to_tick(self):
+        midi = pretty_midi.PrettyMIDI(resolution = 480, initial_tempo = 97)
+        midi._tick_scales += [(1000, 60 / (140 * 480)), (5000, 60 / (63 * 480)), (9000, 60 / (200 * 480))]
+        midi._update_tick_to_time(12000)
+
+        ticks = np.arange(12000)
+        tick_times = midi_utils.ticks_to_times(midi, ticks)
+        np.testing.assert_array_equal(tick_times, [midi.tick_to_time(int(tick)) for tick in ticks])
+
+        # Random times, exact tick times and midpoints between ticks
+        times = np.concatenate([
+            np.random.default_rng(0).uniform(-1, tick_times[-1], 2000), tick_times, (tick_times[1:] + tick_times[:-1]) / 2,
+        ])
+        np.testing.assert_array_equal(midi_utils.times_to_ticks(midi, times), [midi.time_to_tick(time) for time in times])
+
+    def test_times_to_ticks_past_the_tick_table(self):
+        # 330 ticks per second: every other quarter second falls halfway between two ticks
+        midi = pretty_midi.PrettyMIDI(initial_tempo = 90)
+        times = np.arange(480) / 8
+        ticks = midi_utils.times_to_ticks(midi, times)
+
+        # Past its tick table, pretty_midi rounds ties half to even
+        fresh = np.array([midi.time_to_tick(time) for time in times])
+        ties = (times * 330) % 1 == 0.5
+        self.assertEqual(np.count_nonzero(ties), 120)
+        np.testing.assert_array_equal(fresh[~ties], ticks[~ties])
+        np.testing.assert_array_equal(ticks[ties], np.floor(times[ties] * 330) + 1)
+        np.testing.assert_array_equal(fresh[ties] % 2, 0)
+
+        # Within the table, ties go to the later tick as in times_to_ticks
+        midi._update_tick_to_time(int(ticks[-1]) + 1)
+        np.testing.assert_array_equal(ticks, [midi.time_to_tick(time) for time in times])
+
+    def test_get_chord_key(self):
+        key = midi_utils.get_chord_key([Note(64), Note(59), Note(64), Note(55)])
+        self.assertEqual(key, (55, 59, 64))
+        self.assertEqual(key, midi_utils.get_chord_key([Note(55), Note(64), Note(59)]))
+
+    def test_get_events_between(self):
+        timeline = {960: "c", 0: "a", 480: "b", 1920: "e", 1440: "d"}
+        ticks = sorted(timeline)
+
+        self.assertEqual(midi_utils.get_events_between(timeline, 480, 1440), {480: "b", 960: "c"})
+        self.assertEqual(list(midi_utils.get_events_between(timeline, 0, 1500, ticks).items()),
+                         [(0, "a"), (480, "b"), (960, "c"), (1440, "d")])
+        for start, end in [(0, 480), (1, 960), (500, 2000), (2000, 3000)]:
+            self.assertEqual(midi_utils.get_events_between(timeline, start, end, ticks),
+                             midi_utils.get_events_between(timeline, start, end))
@@ -1,8 +1,16 @@
 """Unit tests for the Tab class."""
 
+import io
+import json
+import math
+import os
+import tempfile
 import unittest
+import numpy as np
 import pretty_midi
 
+from tuttut.logic import graph_utils
+from tuttut.logic.midi_utils import fill_measure_str
 from tuttut.logic.tab import Tab
 from tuttut.logic.theory import Tuning
 
@@ -75,6 +83,22 @@ class TestBuildTimeline(unittest.TestCase):
         has_time_sig = any("time_signature" in v for v in tab.timeline.values())
         self.assertTrue(has_time_sig)
 
+    def test_columnar_timeline_merges_instruments(self):
+        """Notes of all instruments are merged in tick order and grouped into chords."""
+        midi = _make_midi([(64, 0.5, 1.0), (60, 0.0, 0.5)])
+        second = pretty_midi.Instrument(program=0)
+        second.notes.append(pretty_midi.Note(velocity=90, pitch=48, start=0.0, end=1.0))
+        midi.instruments.append(second)
+        tab = Tab("test", self.tuning, midi)
+
+        self.assertEqual(list(tab.timeline), [midi.time_to_tick(0.0), midi.time_to_tick(0.5)])
+        self.assertEqual(tab.timeline.notes.pitch.tolist(), [60, 48, 64])
+        self.assertEqual(tab.timeline.notes.instrument.tolist(), [0, 1, 0])
+        chord = tab.timeline[midi.time_to_tick(0.0)]["notes"]
+        self.assertEqual(chord.end_tick.tolist(), [midi.time_to_tick(0.5), midi.time_to_tick(1.0)])
+        with self.assertRaises(KeyError):
+            tab.timeline[1]
+
 
 class TestPopulate(unittest.TestCase):
     def setUp(self):
@@ -110,6 +134,18 @@ class TestPopulate(unittest.TestCase):
 
         self.assertEqual(len(tab.tab["measures"]), len(tab.measures))
 
+    def test_time_signature_change_starts_a_measure(self):
+        """Measure bounds are rounded to ticks like the timeline, even halfway between two ticks."""
+        change_time = 2.0 + 0.5 * (60 / 120 / 220)  # halfway between ticks 880 and 881
+        midi = _make_midi([(64, 0.0, 0.5), (59, change_time, 3.0)])
+        midi.time_signature_changes = [pretty_midi.TimeSignature(4, 4, 0.0), pretty_midi.TimeSignature(3, 4, change_time)]
+        tab = Tab("test", self.tuning, midi)
+
+        measure = next(m for m in tab.measures if m.time_signature.numerator == 3)
+        first_event = tab.tab["measures"][tab.measures.index(measure)]["events"][0]
+        self.assertEqual(first_event["time_signature_change"], [3, 4])
+        self.assertEqual(first_event["measure_timing"], 0)
+
 
 class TestTabStructure(unittest.TestCase):
     def setUp(self):
@@ -226,6 +262,91 @@ class TestToString(unittest.TestCase):
         lengths = [len(line) for line in tab.to_string()]
         self.assertEqual(len(set(lengths)), 1)
 
+    def test_matches_incremental_renderer(self):
+        """Rendering is identical to padding every line with fill_measure_str after each event."""
+        def incremental_to_string(tab):
+            res = [string.degree + ("||" if len(string.degree) > 1 else " ||") for string in tab.tuning.strings]
+            for measure in tab.tab["measures"]:
+                for ievent, event in enumerate(measure["events"]):
+                    if "notes" in event:
+                        for note in event["notes"]:
+                            res[note["string"]] += str(note["fret"])
+                        next_timing = measure["events"][ievent + 1]["measure_timing"] if ievent < len(measure["events"]) - 1 else 1.0
+                        res = fill_measure_str(res)
+                        res = [line + "-" * max(1, math.floor((next_timing - event["measure_timing"]) * 16)) for line in res]
+                res = [line + "|" for line in res]
+            return res
+
+        notes = [(40 + (i * 7) % 30, i * 0.3, i * 0.3 + 0.2) for i in range(40)] + [(52, 0.0, 0.5), (76, 0.9, 1.2)]
+        tab = Tab("test", self.tuning, _make_midi(notes))
+        tab.tab["measures"][0]["events"].insert(1, {"measure_timing": 0.05, "notes": []})
+        tab.tab["measures"][-1]["events"].append({"measure_timing": 0.99, "time_signature_change": [4, 4]})
+
+        self.assertEqual(tab.to_string(), incremental_to_string(tab))
+
+    def test_write_ascii_to_stream(self):
+        """Unwrapped output to a text stream matches to_string."""
+        notes = [(40 + (i * 7) % 30, i * 0.3, i * 0.3 + 0.2) for i in range(40)]
+        tab = Tab("test", self.tuning, _make_midi(notes))
+
+        stream = io.StringIO()
+        tab.write_ascii(stream)
+        self.assertEqual(stream.getvalue(), "".join(line + "\n" for line in tab.to_string()))
+
+    def test_write_ascii_wraps_measures_into_systems(self):
+        """Wrapped output splits the tab into systems at measure boundaries."""
+        notes = [(40 + (i * 7) % 30, i * 0.3, i * 0.3 + 0.2) for i in range(40)]
+        tab = Tab("test", self.tuning, _make_midi(notes))
+        consumed = []
+
+        def measures():
+            for measure in tab.tab["measures"]:
+                consumed.append(measure)
+                yield measure
+
+        stream = io.StringIO()
+        tab.write_ascii(stream, measures(), wrap=80)
+        systems = stream.getvalue().rstrip("\n").split("\n\n")
+
+        self.assertEqual(len(consumed), len(tab.tab["measures"]))
+        self.assertGreater(len(systems), 1)
+        joined = ["" for _ in range(self.tuning.nstrings)]
+        for system in systems:
+            lines = system.split("\n")
+            self.assertEqual(len(lines), self.tuning.nstrings)
+            for istring, line in enumerate(lines):
+                self.assertLessEqual(len(line), 80)
+                joined[istring] += line[4:] if joined[istring] else line
+        self.assertEqual(joined, tab.to_string())
+
+
+class TestToJson(unittest.TestCase):
+    def setUp(self):
+        self.tuning = Tuning()
+        notes = [(40 + (i * 7) % 30, i * 0.3, i * 0.3 + 0.2) for i in range(40)]
+        self.tab = Tab("test", self.tuning, _make_midi(notes))
+
+    def test_streamed_json_matches_json_dumps(self):
+        """Measure-by-measure output is identical to serializing the whole tab at once."""
+        stream = io.StringIO()
+        self.tab.to_json(stream)
+        self.assertEqual(stream.getvalue(), json.dumps(self.tab.tab, indent=4))
+
+    def test_compact_json(self):
+        """Compact output has no whitespace and decodes to the same tab."""
+        stream = io.StringIO()
+        self.tab.to_json(stream, compact=True)
+        self.assertEqual(stream.getvalue(), json.dumps(self.tab.tab, separators=(",", ":")))
+        self.assertEqual(json.loads(stream.getvalue()), json.loads(json.dumps(self.tab.tab)))
+
+    def test_json_written_to_output_dir(self):
+        """Without an explicit output, the file is written to the tab output directory."""
+        with tempfile.TemporaryDirectory() as tmp:
+            self.tab.output_dir = tmp
+            self.tab.to_json()
+            with open(os.path.join(tmp, "test.json")) as file:
+                self.assertEqual(json.load(file), json.loads(json.dumps(self.tab.tab)))
+
 
 class TestTabEdgeCases(unittest.TestCase):
     def setUp(self):
@@ -257,3 +378,163 @@ class TestTabEdgeCases(unittest.TestCase):
         tab = Tab("test", self.tuning, midi, weights=weights)
 
         self.assertEqual(tab.weights, weights)
+
+    def test_streaming_decoder_with_full_lag_matches_exact(self):
+        """Fixed-lag decoding with a lag covering the whole piece gives the exact tab."""
+        notes = [(64, 0.0, 0.5), (59, 0.5, 1.0), (55, 1.0, 1.5), (62, 1.5, 2.0), (57, 2.0, 2.5)]
+        exact = Tab("test", self.tuning, _make_midi(notes))
+        streamed = Tab("test", self.tuning, _make_midi(notes), lag=len(notes))
+
+        self.assertEqual(streamed.tab, exact.tab)
+
+    def test_chord_ranges_partition_fingering_vocabulary(self):
+        """Each vocabulary chord owns one contiguous range of fingering indices."""
+        midi = _make_midi([(64, 0.0, 0.5), (59, 0.5, 1.0), (64, 1.0, 1.5), (55, 1.5, 2.0)])
+        tab = Tab("test", self.tuning, midi)
+
+        notes_vocabulary, _, fingerings_vocabulary, chord_ranges, _ = tab._build_hmm_inputs({"measures": []})
+        self.assertEqual(len(chord_ranges), len(notes_vocabulary))
+        self.assertEqual(chord_ranges[0][0], 0)
+        self.assertEqual(chord_ranges[-1][1], len(fingerings_vocabulary))
+        for (_, stop), (start, _) in zip(chord_ranges[:-1], chord_ranges[1:]):
+            self.assertEqual(stop, start)
+
+        # Fingerings are stored as node ids, padded to the largest chord
+        self.assertEqual(fingerings_vocabulary.dtype, np.int16)
+        first_chord = tab.fretboard.get_fingerings_from_ids(fingerings_vocabulary[slice(*chord_ranges[0])])
+        self.assertIn(tab.fingering_sequence[0], first_chord)
+
+    def test_equal_pitch_sets_share_one_vocabulary_entry(self):
+        """Chords that are equal once made playable map to the same vocabulary id."""
+        # E6 (88) is above the guitar range and is played as E5 (76)
+        midi = _make_midi([(76, 0.0, 0.5), (88, 0.5, 1.0), (76, 1.0, 1.5), (64, 1.5, 2.0)])
+        tab = Tab("test", self.tuning, midi)
+
+        notes_vocabulary, notes_sequence, _, _, _ = tab._build_hmm_inputs({"measures": []})
+        self.assertEqual(notes_vocabulary, [(76,), (64,)])
+        self.assertEqual(notes_sequence, [0, 0, 0, 1])
+
+    def test_oversized_chord_reduced_to_playable_subset(self):
+        """A chord with more notes than strings keeps its bass and top notes and is played."""
+        cluster = [(pitch, 0.0, 0.5) for pitch in range(50, 59)]
+        tab = Tab("test", self.tuning, _make_midi(cluster + [(64, 0.5, 1.0)]))
+
+        reduced = tab.reduced_chords[tuple(range(50, 59))]
+        self.assertLessEqual(len(reduced), self.tuning.nstrings)
+        self.assertEqual((reduced[0], reduced[-1]), (50, 58))
+        chord_event = tab.tab["measures"][0]["events"][0]
+        self.assertEqual(len(chord_event["notes"]), len(reduced))
+
+    def test_unreduced_oversized_chord_left_unplayed(self):
+        """Without a reduction policy, an oversized chord keeps no notes and is not decoded."""
+        cluster = [(pitch, 0.5, 1.0) for pitch in range(50, 59)]
+        tab = Tab("test", self.tuning, _make_midi([(64, 0.0, 0.5)] + cluster + [(59, 1.0, 1.5)]), chord_reduction=None)
+
+        events = tab.tab["measures"][0]["events"]
+        self.assertEqual([len(event["notes"]) for event in events], [1, 0, 1])
+        self.assertEqual(len(tab.fingering_sequence), 2)
+        self.assertEqual(tab.tab["measures"][0]["events"][2]["notes"][0]["degree"], "B")
+
+    def test_fingering_pruning_bounds_vocabulary(self):
+        """Keeping the easiest fingerings caps each chord's states and reports the quality loss."""
+        notes = [(48, 0.0, 0.5), (52, 0.0, 0.5), (55, 0.0, 0.5), (57, 0.5, 1.0), (60, 0.5, 1.0), (64, 1.0, 1.5)]
+        tab = Tab("test", self.tuning, _make_midi(notes), max_fingerings=2)
+
+        _, _, fingerings_vocabulary, chord_ranges, _ = tab._build_hmm_inputs({"measures": []})
+        for start, stop in chord_ranges:
+            self.assertLessEqual(stop - start, 2)
+
+        report = tab.pruning_report()
+        self.assertEqual(report["n_pruned_fingerings"], len(fingerings_vocabulary))
+        self.assertGreater(report["n_fingerings"], report["n_pruned_fingerings"])
+        self.assertGreater(report["full_difficulty"], 0)
+        self.assertLessEqual(report["n_differences"], 3)
+
+    def test_decode_matches_dense_transition_matrix(self):
+        """The tab is the Viterbi path of the dense transition matrix over the whole vocabulary."""
+        rng = np.random.default_rng(0)
+        notes = [
+            (int(pitch), i * 0.3, i * 0.3 + 0.2)
+            for i in range(30) for pitch in rng.choice(np.arange(40, 76), int(rng.integers(1, 4)), replace=False)
+        ]
+        tab = Tab("test", self.tuning, _make_midi(notes))
+
+        _, notes_sequence, fingering_ids, chord_ranges, initial_probabilities = tab._build_hmm_inputs({"measures": []})
+        fingerings_vocabulary = tab.fretboard.get_fingerings_from_ids(fingering_ids)
+        emission_matrix = np.array([])
+        for start, stop in chord_ranges:
+            emission_matrix = graph_utils.expand_emission_matrix(emission_matrix, fingerings_vocabulary[start:stop])
+        transition_matrix = graph_utils.build_transition_matrix(
+            tab.fretboard.positions, fingerings_vocabulary, tab.weights, self.tuning
+        )
+        initial = np.hstack((initial_probabilities, np.zeros(len(fingerings_vocabulary) - len(initial_probabilities))))
+        expected = graph_utils.viterbi(notes_sequence, transition_matrix, emission_matrix, initial)
+
+        positions = lambda fingering: tuple(tab.fretboard.positions[note] for note in fingering)
+        self.assertEqual(
+            [positions(f) for f in tab.fingering_sequence],
+            [positions(fingerings_vocabulary[i]) for i in expected],
+        )
+
+    def test_beam_decoder_selectable(self):
+        """A wide enough beam gives the same tab as exact Viterbi."""
+        notes = [(64, 0.0, 0.5), (59, 0.5, 1.0), (55, 1.0, 1.5), (62, 1.5, 2.0)]
+        exact = Tab("test", self.tuning, _make_midi(notes))
+        beam = Tab("test", self.tuning, _make_midi(notes), decoder="beam", beam_width=64)
+
+        self.assertEqual(beam.tab, exact.tab)
+
+    def test_conflicting_decoder_options_rejected(self):
+        """Unknown decoders and decoding options that cannot be combined raise instead of being ignored."""
+        midi = _make_midi([(64, 0.0, 0.5), (59, 0.5, 1.0)])
+        for options in ({"decoder": "bogus"}, {"lag": 2, "decoder": "beam"}, {"lag": 2, "n_workers": 2}):
+            with self.assertRaises(ValueError):
+                Tab("test", self.tuning, midi, **options)
+
+    def test_float32_precision_reports_decoder_buffers(self):
+        """Compact decoding buffers give the same tab and report their sizes."""
+        notes = [(64, 0.0, 0.5), (59, 0.5, 1.0), (55, 1.0, 1.5), (62, 1.5, 2.0)]
+        exact = Tab("test", self.tuning, _make_midi(notes))
+        compact = Tab("test", self.tuning, _make_midi(notes), precision="float32")
+
+        self.assertEqual(compact.tab, exact.tab)
+        self.assertEqual(set(compact.decoder_buffers), {"omega", "scores", "prev"})
+        self.assertLess(compact.decoder_buffers["scores"], exact.decoder_buffers["scores"])
+
+        for options in ({"lag": 2}, {"n_workers": 2}):
+            exact = Tab("test", self.tuning, _make_midi(notes), **options)
+            compact = Tab("test", self.tuning, _make_midi(notes), precision="float32", **options)
+            self.assertEqual(compact.tab, exact.tab)
+            self.assertEqual(compact.decoder_buffers["omega"] * 2, exact.decoder_buffers["omega"])
+
+    def test_segment_anchors_after_rests(self):
+        """Chords following a rest are anchors for segment-parallel decoding."""
+        midi = _make_midi([(64, 0.0, 0.25), (59, 0.25, 0.5), (55, 1.0, 1.25), (62, 1.25, 1.5)])
+        tab = Tab("test", self.tuning, midi)
+
+        self.assertEqual(tab._find_segment_anchors(), [2])
+
+    def test_segment_parallel_decoding(self):
+        """Decoding across worker processes yields a complete, playable tab."""
+        notes = [(60 + (i * 5) % 12, i * 0.5, i * 0.5 + 0.25) for i in range(12)]
+        tab = Tab("test", self.tuning, _make_midi(notes), n_workers=2)
+
+        note_events = [event for measure in tab.tab["measures"] for event in measure["events"] if "notes" in event]
+        self.assertEqual(len(note_events), len(notes))
+        for event in note_events:
+            self.assertEqual(len(event["notes"]), 1)
+
+    def test_segment_parallel_decoding_with_cuts(self):
+        """A piece cut at its rests is decoded by the workers as by a single process."""
+        notes = []
+        time = 0.0
+        for i in range(48):
+            notes.append((52 + (i * 7) % 20, time, time + 0.25))
+            time += 1.0 if i % 12 == 11 else 0.25
+        single = Tab("test", self.tuning, _make_midi(notes))
+        parallel = Tab("test", self.tuning, _make_midi(notes), n_workers=2, min_segment_length=8, segment_overlap=3)
+
+        self.assertEqual(parallel._find_segment_anchors(), [12, 24, 36])
+        self.assertEqual(parallel.tab, single.tab)
+        # Each worker only held the backpointers of its own segment
+        self.assertLess(parallel.decoder_buffers["prev"], single.decoder_buffers["prev"] / 2)
@@ -0,0 +1,171 @@
+import struct
+import numpy as np
+from tuttut.logic.theory import Note
+
+BINARY_TAB_MAGIC = b"TUTTAB\0\0"
+BINARY_TAB_VERSION = 1
+_HEADER = struct.Struct("<8sIIQQQ")  # magic, version, nstrings, n_measures, n_events, n_notes
+_ALIGNMENT = 8
+
+# Arrays of the container, in file order: (name, dtype, header count giving the length, extra items, item shape)
+_SECTIONS = (
+  ("tuning", np.int16, "nstrings", 0, ()),
+  ("measure_offsets", np.int64, "n_measures", 1, ()),
+  ("event_ticks", np.int64, "n_events", 0, ()),
+  ("event_times", np.float64, "n_events", 0, ()),
+  ("event_timings", np.float64, "n_events", 0, ()),
+  ("event_time_signatures", np.int16, "n_events", 0, (2,)),
+  ("event_note_offsets", np.int64, "n_events", 1, ()),
+  ("event_has_notes", np.bool_, "n_events", 0, ()),
+  ("note_strings", np.int8, "n_notes", 0, ()),
+  ("note_frets", np.int8, "n_notes", 0, ()),
+)
+
+
+def write_binary_tab(output, tab):
+  """Writes tab data to a compact binary container.
+
+  The container is a fixed header followed by one aligned array per section of _SECTIONS: the
+  tuning, the offsets of the events of each measure, the tick, time, measure timing and time
+  signature change of each event, the offsets of the notes of each event, and the string and fret
+  of each note. Note degrees and octaves are derived from the tuning when reading.
+
+  Args:
+      output (str, Path or binary file-like): Path of the file to write, or binary stream to write to
+      tab (dict): Tab data, as built by Tab.gen_tab
+  """
+  events = [event for measure in tab["measures"] for event in measure["events"]]
+  notes = [note for event in events for note in event.get("notes", [])]
+  counts = {
+    "nstrings": len(tab["tuning"]), "n_measures": len(tab["measures"]), "n_events": len(events), "n_notes": len(notes),
+  }
+
+  arrays = {
+    "tuning": tab["tuning"],
+    "measure_offsets": np.cumsum([0] + [len(measure["events"]) for measure in tab["measures"]]),
+    "event_ticks": [event["time_ticks"] for event in events],
+    "event_times": [event["time"] for event in events],
+    "event_timings": [event["measure_timing"] for event in events],
+    "event_time_signatures": [event.get("time_signature_change", (0, 0)) for event in events],
+    "event_note_offsets": np.cumsum([0] + [len(event.get("notes", [])) for event in events]),
+    "event_has_notes": ["notes" in event for event in events],
+    "note_strings": [note["string"] for note in notes],
+    "note_frets": [note["fret"] for note in notes],
+  }
+
+  stream = open(output, "wb") if not hasattr(output, "write") else output
+  try:
+    stream.write(_HEADER.pack(BINARY_TAB_MAGIC, BINARY_TAB_VERSION, *counts.values()))
+    position = _HEADER.size
+    for name, dtype, count, extra, shape in _SECTIONS:
+      padding = -position % _ALIGNMENT
+      stream.write(b"\0" * padding)
+      data = np.asarray(arrays[name], dtype=np.dtype(dtype).newbyteorder("<")).reshape((counts[count] + extra,) + shape)
+      stream.write(data.tobytes())
+      position += padding + data.nbytes
+  finally:
+    if stream is not output:
+      stream.close()
+
+
+class BinaryTab:
+  """Memory-mapped reader of a binary tab container.
+
+  The arrays of the container are views of the mapped file, so opening a tab reads nothing but
+  its header, and slicing measures only reads the pages holding them.
+  """
+  def __init__(self, path):
+    """Constructor for the BinaryTab object.
+
+    Args:
+        path (str or Path): Path of a file written by write_binary_tab
+    """
+    self.path = path
+    self._buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    magic, version, nstrings, n_measures, n_events, n_notes = _HEADER.unpack(bytes(self._buffer[:_HEADER.size]))
+    if magic != BINARY_TAB_MAGIC:
+      raise ValueError(f"{path} is not a binary tab")
+    if version != BINARY_TAB_VERSION:
+      raise ValueError(f"Unsupported binary tab version {version}, expected {BINARY_TAB_VERSION}")
+
+    counts = {"nstrings": nstrings, "n_measures": n_measures, "n_events": n_events, "n_notes": n_notes}
+    position = _HEADER.size
+    for name, dtype, count, extra, shape in _SECTIONS:
+      position += -position % _ALIGNMENT
+      length = counts[count] + extra
+      array = np.frombuffer(
+        self._buffer, dtype=np.dtype(dtype).newbyteorder("<"), count=length * int(np.prod(shape)), offset=position,
+      )
+      setattr(self, name, array.reshape((length,) + shape))
+      position += array.nbytes
+
+    self._notes = {}  # Degree and octave of each (string, fret), built on demand
+
+  def __len__(self):
+    """Returns the number of measures."""
+    return len(self.measure_offsets) - 1
+
+  def __getitem__(self, index):
+    """Returns a measure, or a list of measures for a slice, as tab data dicts."""
+    if isinstance(index, slice):
+      return [self.get_measure(imeasure) for imeasure in range(*index.indices(len(self)))]
+    if index < 0:
+      index += len(self)
+    if not 0 <= index < len(self):
+      raise IndexError(index)
+    return self.get_measure(index)
+
+  def get_measure(self, imeasure):
+    """Returns a measure as tab data.
+
+    Args:
+        imeasure (int): Index of the measure
+
+    Returns:
+        dict: Measure with its "events", as in Tab.tab
+    """
+    events = []
+    for ievent in range(self.measure_offsets[imeasure], self.measure_offsets[imeasure + 1]):
+      event = {
+        "time": float(self.event_times[ievent]),
+        "time_ticks": int(self.event_ticks[ievent]),
+        "measure_timing": float(self.event_timings[ievent]),
+      }
+      if self.event_time_signatures[ievent, 0] != 0:
+        event["time_signature_change"] = self.event_time_signatures[ievent].tolist()
+      if self.event_has_notes[ievent]:
+        start, stop = self.event_note_offsets[ievent], self.event_note_offsets[ievent + 1]
+        event["notes"] = [
+          self._get_note(string, fret)
+          for string, fret in zip(self.note_strings[start:stop].tolist(), self.note_frets[start:stop].tolist())
+        ]
+      events.append(event)
+    return {"events": events}
+
+  def get_measure_positions(self, start, stop):
+    """Returns the strings and frets of the notes of a range of measures, without building dicts.
+
+    Args:
+        start (int): Index of the first measure
+        stop (int): Index following the last measure
+
+    Returns:
+        tuple: (strings, frets, event_note_offsets) arrays, the offsets giving the notes of each
+               event relative to the first note of the range
+    """
+    first_event, last_event = self.measure_offsets[start], self.measure_offsets[stop]
+    offsets = self.event_note_offsets[first_event:last_event + 1]
+    first_note, last_note = offsets[0], offsets[-1]
+    return self.note_strings[first_note:last_note], self.note_frets[first_note:last_note], offsets - first_note
+
+  def to_dict(self):
+    """Returns the whole tab data, as in Tab.tab."""
+    return {"tuning": self.tuning.tolist(), "measures": self[:]}
+
+  def _get_note(self, string, fret):
+    """Returns the tab data of the note played on a string and fret."""
+    note = self._notes.get((string, fret))
+    if note is None:
+      theory_note = Note(int(self.tuning[string]) + fret)
+      note = self._notes[(string, fret)] = {"degree": theory_note.degree, "octave": theory_note.octave}
+    return {**note, "string": string, "fret": fret}
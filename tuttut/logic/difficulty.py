@@ -55,6 +55,58 @@ def compute_isolated_path_difficulty(positions, path, tuning):
     return 1 / easiness
 
 
+def compute_isolated_difficulties(stats):
+    """Computes compute_isolated_path_difficulty for many fingerings at once.
+
+    Args:
+        stats (dict): Stats of the fingerings, see compute_fingering_stats
+
+    Returns:
+        np.ndarray: Difficulty of each fingering without considering the previous one
+    """
+    return (1 + stats["height_score"]) * (1 + stats["span_score"])
+
+
+def select_easiest_fingerings(difficulties, top_k=None, max_cost_ratio=None):
+    """Selects the easiest fingerings of a chord by their isolated difficulty.
+
+    Args:
+        difficulties (np.ndarray): Isolated difficulty of each fingering of the chord
+        top_k (int, optional): Keep at most this many fingerings. Defaults to None (no limit).
+        max_cost_ratio (float, optional): Keep only fingerings at most this many times as difficult as
+            the easiest one. Defaults to None (no limit).
+
+    Returns:
+        np.ndarray: Indices of the kept fingerings, in their original order
+    """
+    difficulties = np.asarray(difficulties)
+    keep = np.ones(len(difficulties), dtype=bool)
+    if max_cost_ratio is not None and len(difficulties) > 0:
+        keep &= difficulties <= np.min(difficulties) * max_cost_ratio
+    if top_k is not None and np.count_nonzero(keep) > top_k:
+        ranked = np.flatnonzero(keep)[np.argsort(difficulties[keep], kind="stable")]
+        keep[ranked[top_k:]] = False
+    return np.flatnonzero(keep)
+
+
+def get_sequence_difficulty(positions, sequence, weights, tuning):
+    """Computes the total difficulty of playing a sequence of fingerings.
+
+    Args:
+        positions (dict): Mapping from fretboard node to (string, fret) position tuple
+        sequence (list): Fingerings played one after the other
+        weights (dict): Difficulty component weights
+        tuning (Tuning): Instrument tuning
+
+    Returns:
+        float: Sum of the difficulty of each fingering given the previous one
+    """
+    return sum(
+        compute_path_difficulty(positions, path, sequence[i - 1] if i > 0 else (), weights, tuning)
+        for i, path in enumerate(sequence)
+    )
+
+
 def laplace_distro(x, b, mu=0.0):
     """Returns the y value for x on a Laplace distribution.
 
@@ -177,7 +229,7 @@ def get_path_length(G, path):
 
 
 def precompute_fingering_stats(positions, fingerings, tuning):
-    """Precomputes per-fingering stats to avoid redundant computation in the transition matrix.
+    """Precomputes per-fingering stats as arrays to vectorize the transition matrix.
 
     Args:
         positions (dict): Mapping from fretboard node to (string, fret) position tuple
@@ -185,21 +237,98 @@ def precompute_fingering_stats(positions, fingerings, tuning):
         tuning (Tuning): Instrument tuning
 
     Returns:
-        list[dict]: One dict per fingering with keys: raw_height, height_score, span_score,
-                    all_strings, non_open_strings, n_notes
-    """
-    stats = []
-    for f in fingerings:
-        rh = get_raw_height(positions, f)
-        stats.append({
-            "raw_height": rh,
-            "height_score": get_height_score(rh, tuning),
-            "span_score": get_path_span(positions, f),
-            "all_strings": frozenset(positions[note][0] for note in f),
-            "non_open_strings": frozenset(positions[note][0] for note in f if positions[note][1] != 0),
-            "n_notes": len(f),
-        })
-    return stats
+        dict: One array per stat, see compute_fingering_stats
+    """
+    strings, frets = get_fingering_coordinates(positions, fingerings)
+    return compute_fingering_stats(strings, frets, tuning)
+
+
+def get_fingering_coordinates(positions, fingerings):
+    """Returns the strings and frets of fingerings as padded integer arrays.
+
+    Args:
+        positions (dict): Mapping from fretboard node to (string, fret) position tuple
+        fingerings (list): Fingerings to convert
+
+    Returns:
+        tuple: (strings, frets) arrays of shape (n_fingerings, max_notes), padded with -1
+    """
+    max_notes = max((len(f) for f in fingerings), default=0)
+    coordinates = np.full((len(fingerings), max_notes, 2), -1, dtype=np.int16)
+    for i, f in enumerate(fingerings):
+        if len(f) > 0:
+            coordinates[i, :len(f)] = [positions[note] for note in f]
+    return coordinates[:, :, 0], coordinates[:, :, 1]
+
+
+def compute_fingering_stats(strings, frets, tuning):
+    """Computes per-fingering stats from padded string and fret arrays.
+
+    String sets are stored as bitmasks, bit i being set when string i is used.
+
+    Args:
+        strings (np.ndarray): String of each note, shape (n_fingerings, max_notes), padded with -1
+        frets (np.ndarray): Fret of each note, same shape, padded with -1
+        tuning (Tuning): Instrument tuning
+
+    Returns:
+        dict: One array per stat, indexed by fingering: raw_height, height_score, span_score,
+              n_notes, all_strings, non_open_strings
+    """
+    used = strings >= 0
+    fretted = used & (frets > 0)
+    any_fretted = np.any(fretted, axis=1)
+
+    highest = np.max(np.where(fretted, frets, 0), axis=1, initial=0)
+    no_fret = np.iinfo(frets.dtype).max
+    lowest = np.min(np.where(fretted, frets, no_fret), axis=1, initial=no_fret)
+    raw_height = np.where(any_fretted, (highest + lowest) / 2, 0)
+    span_score = np.where(any_fretted, (highest - lowest) / SPAN_NORMALIZATION, 0)
+
+    string_bits = np.left_shift(1, np.maximum(strings, 0).astype(np.int64))
+    return {
+        "raw_height": raw_height,
+        "height_score": raw_height / tuning.nfrets,
+        "span_score": span_score,
+        "n_notes": np.sum(used, axis=1).astype(np.int8),
+        "all_strings": np.bitwise_or.reduce(np.where(used, string_bits, 0), axis=1, initial=0),
+        "non_open_strings": np.bitwise_or.reduce(np.where(fretted, string_bits, 0), axis=1, initial=0),
+    }
+
+
+def select_fingering_stats(stats, indices):
+    """Returns the stats of a subset of fingerings.
+
+    Args:
+        stats (dict): Stats returned by precompute_fingering_stats
+        indices (np.ndarray): Indices of the fingerings to keep
+
+    Returns:
+        dict: Stats of the selected fingerings
+    """
+    return {key: values[indices] for key, values in stats.items()}
+
+
+def count_set_bits(masks, nbits):
+    """Counts the set bits of an array of string bitmasks.
+
+    Args:
+        masks (np.ndarray): Integer bitmasks
+        nbits (int): Number of meaningful bits (number of strings)
+
+    Returns:
+        np.ndarray: Number of set bits of each mask
+    """
+    if nbits <= 16:
+        table = np.zeros(1 << nbits, dtype=np.int8)
+        for bit in range(nbits):
+            table[1 << bit:2 << bit] = table[:1 << bit] + 1
+        return table[masks]
+
+    counts = np.zeros(np.shape(masks), dtype=np.int64)
+    for bit in range(nbits):
+        counts += (masks >> bit) & 1
+    return counts
 
 
 def get_path_span(positions, path):
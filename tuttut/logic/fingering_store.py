@@ -0,0 +1,190 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+FINGERING_STORE_VERSION = 1  # Bump whenever the fingering enumeration rules change
+DEFAULT_CACHE_SIZE = 100000  # Maximum number of fingerings held by the process-wide cache
+DEFAULT_FLUSH_SIZE = 1000  # Number of buffered chords written to a store in one transaction
+
+
+class FingeringStore:
+    """Persistent on-disk table of chord fingerings, shared between processes and runs.
+
+    Fingerings are stored as (string, fret) coordinates, keyed by a tuning fingerprint and the
+    canonical pitch set of the chord. Rows are read lazily, one chord at a time, so opening a
+    large store costs nothing until a chord is looked up. New rows are buffered and written in
+    one transaction by flush, which runs once flush_size chords are pending and on close.
+    """
+
+    def __init__(self, path, flush_size=DEFAULT_FLUSH_SIZE):
+        """Constructor for the FingeringStore object.
+
+        Args:
+            path (str or Path): Path of the store file, created if it does not exist
+            flush_size (int, optional): Number of pending chords that triggers a write. Defaults to DEFAULT_FLUSH_SIZE.
+        """
+        self.path = path
+        self.flush_size = flush_size
+        self._pending = {}  # (tuning, chord text) -> (n_notes, coordinates) rows not yet written
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = self._connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None or int(row[0]) != FINGERING_STORE_VERSION:
+                self._connection.execute("DROP TABLE IF EXISTS fingerings")
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(FINGERING_STORE_VERSION),)
+                )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS fingerings ("
+                "tuning TEXT, chord TEXT, n_notes INTEGER, coordinates BLOB, PRIMARY KEY (tuning, chord))"
+            )
+
+    def get(self, tuning_fingerprint, chord_key):
+        """Returns the stored fingerings of a chord.
+
+        Args:
+            tuning_fingerprint (str): Fingerprint of the tuning and enumeration rules
+            chord_key (tuple): Sorted MIDI pitches of the chord
+
+        Returns:
+            list: Fingerings as tuples of (string, fret) coordinates, or None if the chord is not stored
+        """
+        key = (tuning_fingerprint, _chord_to_text(chord_key))
+        with self._lock:
+            row = self._pending.get(key)
+        if row is None:
+            row = self._connection.execute(
+                "SELECT n_notes, coordinates FROM fingerings WHERE tuning = ? AND chord = ?", key
+            ).fetchone()
+        if row is None:
+            return None
+
+        n_notes, coordinates = row
+        coordinates = np.frombuffer(coordinates, dtype=np.int16).reshape(-1, n_notes, 2)
+        return [tuple((int(string), int(fret)) for string, fret in fingering) for fingering in coordinates]
+
+    def put(self, tuning_fingerprint, chord_key, fingerings):
+        """Stores the fingerings of a chord, in the write buffer until the next flush.
+
+        Args:
+            tuning_fingerprint (str): Fingerprint of the tuning and enumeration rules
+            chord_key (tuple): Sorted MIDI pitches of the chord
+            fingerings (list): Fingerings as tuples of (string, fret) coordinates
+        """
+        n_notes = len(fingerings[0]) if len(fingerings) > 0 else len(chord_key)
+        coordinates = np.array(fingerings, dtype=np.int16).reshape(-1, n_notes, 2)
+        with self._lock:
+            self._pending[(tuning_fingerprint, _chord_to_text(chord_key))] = (n_notes, coordinates.tobytes())
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered chords to the store file in one transaction."""
+        with self._lock:
+            rows = [key + row for key, row in self._pending.items()]
+            if len(rows) == 0:
+                return
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO fingerings (tuning, chord, n_notes, coordinates) VALUES (?, ?, ?, ?)", rows
+                )
+            self._pending.clear()
+
+    def __len__(self):
+        """Returns the number of stored chords."""
+        self.flush()
+        return self._connection.execute("SELECT COUNT(*) FROM fingerings").fetchone()[0]
+
+    def close(self):
+        """Writes the buffered chords and closes the store file."""
+        self.flush()
+        self._connection.close()
+
+
+class FingeringCache:
+    """Thread-safe, size-bounded LRU cache of chord fingerings.
+
+    Entries are keyed by (tuning fingerprint, chord key) and hold (string, fret) coordinates, so
+    they can be shared by every Fretboard built for the same tuning. The size of an entry is its
+    number of fingerings; the least recently used chords are evicted once the total exceeds maxsize.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        """Constructor for the FingeringCache object.
+
+        Args:
+            maxsize (int, optional): Maximum total number of fingerings kept. Defaults to DEFAULT_CACHE_SIZE.
+        """
+        self.maxsize = maxsize
+        self.size = 0
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tuning_fingerprint, chord_key):
+        """Returns the cached fingerings of a chord.
+
+        Args:
+            tuning_fingerprint (str): Fingerprint of the tuning and enumeration rules
+            chord_key (tuple): Sorted MIDI pitches of the chord
+
+        Returns:
+            list: Fingerings as tuples of (string, fret) coordinates, or None on a miss
+        """
+        key = (tuning_fingerprint, chord_key)
+        with self._lock:
+            fingerings = self._entries.get(key)
+            if fingerings is None:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return fingerings
+
+    def put(self, tuning_fingerprint, chord_key, fingerings):
+        """Adds the fingerings of a chord, evicting the least recently used chords if needed.
+
+        Args:
+            tuning_fingerprint (str): Fingerprint of the tuning and enumeration rules
+            chord_key (tuple): Sorted MIDI pitches of the chord
+            fingerings (list): Fingerings as tuples of (string, fret) coordinates
+        """
+        key = (tuning_fingerprint, chord_key)
+        with self._lock:
+            if key in self._entries:
+                self.size -= _entry_size(self._entries.pop(key))
+            self._entries[key] = fingerings
+            self.size += _entry_size(fingerings)
+
+            while self.size > self.maxsize and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= _entry_size(evicted)
+                self.counters["evictions"] += 1
+
+    def clear(self):
+        """Removes all entries and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __len__(self):
+        """Returns the number of cached chords."""
+        return len(self._entries)
+
+
+shared_fingering_cache = FingeringCache()  # Process-wide cache used by default by every Fretboard
+
+
+def _entry_size(fingerings):
+    """Returns the size of a cache entry; chords without fingerings still count as one."""
+    return max(len(fingerings), 1)
+
+
+def _chord_to_text(chord_key):
+    """Returns the text form of a chord key used in the store."""
+    return ",".join(str(pitch) for pitch in chord_key)
@@ -1,22 +1,51 @@
-import itertools
+import hashlib
 import math
+import numpy as np
 
 from tuttut.logic.theory import Note
 from tuttut.logic.midi_utils import transpose_note, remove_duplicate_notes
-from tuttut.logic.graph_utils import find_valid_paths
+from tuttut.logic.graph_utils import build_distance_table, MAX_EDGE_DISTANCE
+from tuttut.logic.fingering_store import FINGERING_STORE_VERSION, FingeringCache, shared_fingering_cache
 
 DEFAULT_SCALE_LENGTH = 650
 FRET_SCALE_DIVISOR = 17.817  # "Rule of 18": divides remaining scale length to find each fret position
 MAX_FRET_SPAN = 5  # Maximum fret span allowed in a single fingering
+CHORD_REDUCTION_POLICIES = ("outer", "top", "bass")  # Notes kept first: bass and top, highest, lowest
+MAX_CHORD_REDUCTIONS = 6  # Enumerations attempted per chord before falling back to a single note
+
+# Fretted notes within the fret span, sorted by fret, are at most hypot(1, MAX_FRET_SPAN - 1) apart
+# (string offsets are normalised below 1) and open strings are at distance 0, so with these constants
+# every fingering within the span can be chained by valid edges
+_SPAN_IS_CHAINABLE = math.hypot(1, MAX_FRET_SPAN - 1) < MAX_EDGE_DISTANCE
+
+_distance_tables = {}  # Pairwise node distance and edge tables, shared per tuning fingerprint
+_chord_shapes = FingeringCache()  # Fretted chord shapes, keyed by tuning fingerprint and chord intervals
 
 class Fretboard:
-    def __init__(self, tuning):
+    def __init__(self, tuning, store = None, cache = None):
+        """Constructor for the Fretboard object.
+
+        Args:
+            tuning (Tuning): Tuning of the instrument
+            store (FingeringStore, optional): Persistent fingering table read before enumerating a chord
+                and filled with newly enumerated chords. Defaults to None.
+            cache (FingeringCache, optional): In-memory fingering cache. Defaults to the process-wide
+                cache shared by all fretboards.
+        """
         self.tuning = tuning
         self.nstrings = tuning.nstrings
         self.scale_length = DEFAULT_SCALE_LENGTH
         self.positions = self._build_positions()
+        self._nodes_by_position = {position: node for node, position in self.positions.items()}
+        self.nodes = list(self.positions)
+        self.node_ids = {node: inode for inode, node in enumerate(self.nodes)}
+        self.node_pitch, self.node_string, self.node_fret = self._build_node_arrays()
+        self.open_pitches = frozenset(int(p) for p in self.node_pitch[self.node_fret == 0])
+        self.max_fret = int(self.node_fret.max())
         self._pitch_index = self._build_pitch_index()
-        self._fingering_cache = {}
+        self._fingering_cache = shared_fingering_cache if cache is None else cache
+        self.store = store
+        self.fingerprint = self._build_fingerprint()
 
     def _build_positions(self):
         """Builds a {node: (string_index, fret_index)} mapping directly from the tuning.
@@ -31,6 +60,75 @@ class Fretboard:
                 positions[note] = (istring, inote)
         return positions
 
+    def _build_node_arrays(self):
+        """Builds the pitch, string and fret of every node as arrays indexed by integer node id.
+
+        Node ids follow the order of Tuning.get_all_possible_notes: string by string, fret by fret.
+
+        Returns:
+            tuple: (pitch, string, fret) integer arrays
+        """
+        pitch = np.array([node.pitch for node in self.nodes], dtype=np.int16)
+        string = np.array([self.positions[node][0] for node in self.nodes], dtype=np.int16)
+        fret = np.array([self.positions[node][1] for node in self.nodes], dtype=np.int16)
+        return pitch, string, fret
+
+    def get_fingering_ids(self, fingerings):
+        """Returns fingerings as a padded array of integer node ids.
+
+        Args:
+            fingerings (list): Fingerings as tuples of nodes
+
+        Returns:
+            np.ndarray: Node ids of shape (n_fingerings, max_notes), padded with -1
+        """
+        max_notes = max((len(f) for f in fingerings), default=0)
+        ids = np.full((len(fingerings), max_notes), -1, dtype=np.int16)
+        for i, f in enumerate(fingerings):
+            ids[i, :len(f)] = [self.node_ids[note] for note in f]
+        return ids
+
+    def get_fingerings_from_ids(self, ids):
+        """Returns the fingerings of a padded array of integer node ids.
+
+        Args:
+            ids (np.ndarray): Node ids of shape (n_fingerings, max_notes), padded with -1
+
+        Returns:
+            list: Fingerings as tuples of nodes
+        """
+        return [tuple(self.nodes[inode] for inode in row if inode >= 0) for row in ids]
+
+    def get_node_coordinates(self, ids):
+        """Returns the strings and frets of a padded array of integer node ids.
+
+        Args:
+            ids (np.ndarray): Node ids of shape (n_fingerings, max_notes), padded with -1
+
+        Returns:
+            tuple: (strings, frets) arrays of the same shape, padded with -1
+        """
+        used = ids >= 0
+        return np.where(used, self.node_string[ids], -1), np.where(used, self.node_fret[ids], -1)
+
+    @property
+    def distance_table(self):
+        """Fretboard distance between every pair of nodes, indexed by node id, computed once per tuning."""
+        return self._get_distance_tables()[0]
+
+    @property
+    def edge_table(self):
+        """Whether each pair of nodes forms a valid path edge, indexed by node id, computed once per tuning."""
+        return self._get_distance_tables()[1]
+
+    def _get_distance_tables(self):
+        """Returns the (distances, edges) tables of the tuning, building them on first use."""
+        tables = _distance_tables.get(self.fingerprint)
+        if tables is None:
+            tables = build_distance_table(self.node_string, self.node_fret, self.nstrings)
+            _distance_tables[self.fingerprint] = tables
+        return tables
+
     def _build_pitch_index(self):
         """Builds a {pitch: [node, ...]} index for O(1) note lookup.
 
@@ -42,6 +140,21 @@ class Fretboard:
             index.setdefault(node.pitch, []).append(node)
         return index
 
+    def _build_fingerprint(self):
+        """Builds a fingerprint of the tuning and of the rules used to enumerate fingerings.
+
+        Returns:
+            str: Hex digest identifying fingerings that can be shared between fretboards
+        """
+        rules = (
+            FINGERING_STORE_VERSION,
+            tuple(int(string.pitch) for string in self.tuning.strings),
+            self.tuning.nfrets,
+            MAX_FRET_SPAN,
+            MAX_EDGE_DISTANCE,
+        )
+        return hashlib.sha1(repr(rules).encode()).hexdigest()
+
     def _build_complete_graph(self):
         """Builds the complete graph representing the fretboard.
 
@@ -96,26 +209,201 @@ class Fretboard:
         Returns:
             list: List of fingering tuples
         """
-        cache_key = frozenset(opts[0].pitch for opts in note_options)
-        if cache_key in self._fingering_cache:
-            return self._fingering_cache[cache_key]
+        chord_key = tuple(sorted(opts[0].pitch for opts in note_options))
 
-        fingerings = []
+        coordinates = self._fingering_cache.get(self.fingerprint, chord_key)
+        if coordinates is None:
+            coordinates = self.store.get(self.fingerprint, chord_key) if self.store is not None else None
+            if coordinates is None:
+                coordinates = [tuple(self.positions[note] for note in f) for f in self._compute_fingerings(note_options)]
+                if self.store is not None:
+                    self.store.put(self.fingerprint, chord_key, coordinates)
+            self._fingering_cache.put(self.fingerprint, chord_key, coordinates)
+
+        return [tuple(self._nodes_by_position[position] for position in f) for f in coordinates]
+
+    def reduce_chord(self, notes, policy = "outer", max_reductions = MAX_CHORD_REDUCTIONS):
+        """Reduces a chord to a playable subset of its notes and returns its fingerings.
+
+        Chords with more notes than strings are cut down to one note per string before any
+        enumeration. Notes are then dropped one at a time while the chord has no fingering, in
+        the order given by the policy: "outer" keeps the bass and top notes and drops inner notes
+        from the bottom up, "top" keeps the highest notes and "bass" the lowest. After
+        max_reductions unplayable attempts, only the note the policy values most is kept.
+
+        Args:
+            notes (list): Notes of the chord, within the pitch bounds of the tuning
+            policy (str, optional): Reduction policy, one of CHORD_REDUCTION_POLICIES, or None to
+                never reduce. Defaults to "outer".
+            max_reductions (int, optional): Maximum number of chord enumerations attempted.
+                Defaults to MAX_CHORD_REDUCTIONS.
+
+        Returns:
+            tuple: (notes, fingerings) of the reduced chord, notes sorted by pitch
+        """
+        if policy is not None and policy not in CHORD_REDUCTION_POLICIES:
+            raise ValueError(f"Unknown chord reduction policy {policy!r}, expected one of {CHORD_REDUCTION_POLICIES}")
+
+        notes = sorted(notes, key=lambda note: note.pitch)
+        if policy is None:
+            return notes, self.get_possible_fingerings(self.get_note_options(notes))
+
+        while len(notes) > self.nstrings:
+            notes = _drop_note(notes, policy)
+
+        for _ in range(max_reductions):
+            fingerings = self.get_possible_fingerings(self.get_note_options(notes)) if len(notes) > 0 else []
+            if len(fingerings) > 0 or len(notes) <= 1:
+                return notes, fingerings
+            notes = _drop_note(notes, policy)
+
+        notes = notes[:1] if policy == "bass" else notes[-1:]
+        return notes, self.get_possible_fingerings(self.get_note_options(notes)) if len(notes) > 0 else []
+
+    def _compute_fingerings(self, note_options):
+        """Enumerates the fingerings of a chord, bypassing the caches.
 
+        Args:
+            note_options (list): List of possible positions for the notes
+
+        Returns:
+            list: List of fingering tuples
+        """
         if len(note_options) == 1:
-            fingerings = [(note,) for note in note_options[0]]
-        else:
-            seen = set()
-            for note_options_permutation in itertools.permutations(note_options):
-                for path in find_valid_paths(self.positions, note_options_permutation, self.nstrings):
-                    key = frozenset(path)
-                    if key not in seen and self.is_fingering_possible(path, note_options_permutation):
-                        seen.add(key)
-                        fingerings.append(path)
-
-        self._fingering_cache[cache_key] = fingerings
+            return [(note,) for note in note_options[0]]
+        if any(opts[0].pitch in self.open_pitches for opts in note_options):
+            return list(self._enumerate_fingerings(note_options))
+        return self._transpose_chord_shapes(note_options)
+
+    def _transpose_chord_shapes(self, note_options):
+        """Derives the fingerings of a chord without open strings from the shapes of its intervals.
+
+        A chord none of whose notes matches an open string can only be fully fretted, so its
+        fingerings are the shapes of its interval structure moved to its root, as long as every
+        fret stays on the neck. Shapes are enumerated once per interval structure and shared by
+        every transposition of the chord.
+
+        Args:
+            note_options (list): List of possible positions for the notes
+
+        Returns:
+            list: List of fingering tuples, in the order of _enumerate_fingerings
+        """
+        pitches = [opts[0].pitch for opts in note_options]
+        root = min(pitches)
+        intervals = tuple(pitch - root for pitch in pitches)
+
+        shapes = _chord_shapes.get(self.fingerprint, intervals)
+        if shapes is None:
+            shapes = self._enumerate_chord_shapes(intervals)
+            _chord_shapes.put(self.fingerprint, intervals, shapes)
+
+        fingerings = []
+        for shape in shapes:
+            if all(1 <= root + offset <= self.max_fret for _, offset in shape):
+                fingering = tuple(self._nodes_by_position[(string, root + offset)] for string, offset in shape)
+                if self._is_chainable(fingering):
+                    fingerings.append(fingering)
         return fingerings
+
+    def _enumerate_chord_shapes(self, intervals):
+        """Enumerates the fretted shapes of an interval structure, regardless of its root.
+
+        A shape assigns each interval to a distinct string, with the fret offset from the root
+        at which the string plays it. Shapes exceeding the maximum fret span are pruned.
+
+        Args:
+            intervals (tuple): Interval of each note above the root of the chord, in semitones
+
+        Returns:
+            list: Shapes as tuples of (string, fret offset), one per interval
+        """
+        string_pitches = [int(pitch) for pitch in self.node_pitch[self.node_fret == 0]]
+        shape = [None] * len(intervals)
+        used_strings = set()
+        shapes = []
+
+        def backtrack(inote, min_offset, max_offset):
+            if inote == len(intervals):
+                shapes.append(tuple(shape))
+                return
+
+            for string, string_pitch in enumerate(string_pitches):
+                if string in used_strings:
+                    continue
+                offset = intervals[inote] - string_pitch
+                low, high = min(min_offset, offset), max(max_offset, offset)
+                if high - low >= MAX_FRET_SPAN:
+                    continue
+
+                used_strings.add(string)
+                shape[inote] = (string, offset)
+                backtrack(inote + 1, low, high)
+                used_strings.discard(string)
+
+        backtrack(0, math.inf, -math.inf)
+        return shapes
     
+    def _enumerate_fingerings(self, note_options):
+        """Yields every fingering of a chord exactly once.
+
+        Each note is assigned to a distinct string by backtracking, pruning as soon as the
+        fretted notes exceed the maximum fret span. A complete assignment is kept if its notes
+        can be chained by valid edges, as required by find_valid_paths.
+
+        Args:
+            note_options (list): List of possible positions for each note of the chord
+
+        Yields:
+            tuple: Fingering, with one position per note in the order of note_options
+        """
+        fingering = [None] * len(note_options)
+        used_strings = set()
+
+        def backtrack(inote, min_fret, max_fret):
+            if inote == len(note_options):
+                if self._is_chainable(fingering):
+                    yield tuple(fingering)
+                return
+
+            for note in note_options[inote]:
+                string, fret = self.positions[note]
+                if string in used_strings:
+                    continue
+                low, high = (min(min_fret, fret), max(max_fret, fret)) if fret != 0 else (min_fret, max_fret)
+                if high - low >= MAX_FRET_SPAN:
+                    continue
+
+                used_strings.add(string)
+                fingering[inote] = note
+                yield from backtrack(inote + 1, low, high)
+                used_strings.discard(string)
+
+        yield from backtrack(0, math.inf, -math.inf)
+
+    def _is_chainable(self, fingering):
+        """Checks if the notes of a fingering can be ordered into a path of valid edges.
+
+        Always true for fingerings within the fret span as long as _SPAN_IS_CHAINABLE holds.
+        Otherwise the fretted notes sorted by fret followed by the open strings are checked, the
+        order with the smallest fret steps.
+
+        Args:
+            fingering (list): Positions of the fingering
+
+        Returns:
+            bool: Whether a valid path goes through all the notes
+        """
+        if _SPAN_IS_CHAINABLE:
+            return True
+        ordered = sorted(fingering, key=lambda note: (self.positions[note][1] == 0, self.positions[note][1]))
+        return self._is_valid_chain(ordered)
+
+    def _is_valid_chain(self, path):
+        """Checks if every consecutive pair of a path forms a valid edge."""
+        edges = self.edge_table
+        return all(edges[self.node_ids[note], self.node_ids[target]] for note, target in zip(path[:-1], path[1:]))
+
     def fix_oob_notes(self, notes, preserve_highest_note = False):
         min_possible_pitch, max_possible_pitch = self.tuning.get_pitch_bounds()
         
@@ -232,4 +520,13 @@ class Fretboard:
         G = self._build_complete_graph()
         pos = nx.get_node_attributes(G, "pos")
         nx.draw(G, pos=pos)
-        plt.show()
\ No newline at end of file
+        plt.show()
+
+
+def _drop_note(notes, policy):
+    """Returns the notes of a chord sorted by pitch without the note the policy values least."""
+    if policy == "top" or (policy == "outer" and len(notes) <= 2):
+        return notes[1:]
+    if policy == "bass":
+        return notes[:-1]
+    return notes[:1] + notes[2:]
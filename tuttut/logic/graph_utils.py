@@ -1,9 +1,15 @@
 import math
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-from tuttut.logic.difficulty import compute_path_difficulty, precompute_fingering_stats, get_dheight_score, laplace_distro
+from tuttut.logic.difficulty import precompute_fingering_stats, select_fingering_stats, count_set_bits
 
 MAX_EDGE_DISTANCE = 6    # Maximum fretboard distance between two notes to form a valid edge
+DEFAULT_BEAM_WIDTH = 16  # Number of partial paths kept per chord by the beam decoder
+DECODERS = ("viterbi", "beam")  # Exact and beam search decoders of decode_chord_sequence
+DEFAULT_SEGMENT_OVERLAP = 4  # Number of chords re-decoded on each side of a segment cut
+DEFAULT_MIN_SEGMENT_LENGTH = 64  # Minimum number of chords per segment of a segment-parallel decode
 
 
 def _distance_between(p1, p2, nstrings):
@@ -25,6 +31,26 @@ def _distance_between(p1, p2, nstrings):
     return math.dist((p1[0] / nstrings, p1[1]), (p2[0] / nstrings, p2[1]))
 
 
+def build_distance_table(strings, frets, nstrings):
+    """Computes the fretboard distance and edge validity between every pair of nodes.
+
+    Args:
+        strings (np.ndarray): String index of each node
+        frets (np.ndarray): Fret index of each node
+        nstrings (int): Total number of strings, used to normalise string spacing
+
+    Returns:
+        tuple: (distances, edges) arrays of shape (n_nodes, n_nodes), where distances[i, j] is
+               _distance_between(node i, node j) and edges[i, j] tells if i -> j is a valid edge
+    """
+    string_offsets = (strings[:, np.newaxis] - strings[np.newaxis, :]) / nstrings
+    fret_offsets = (frets[:, np.newaxis] - frets[np.newaxis, :]).astype(float)
+    distances = np.sqrt(string_offsets ** 2 + fret_offsets ** 2)
+    distances[:, frets == 0] = 0
+    edges = (distances < MAX_EDGE_DISTANCE) & (strings[:, np.newaxis] != strings[np.newaxis, :])
+    return distances, edges
+
+
 def build_path_graph(positions, note_arrays, nstrings):
     """Returns a path graph corresponding to all possible positions for the notes of a chord.
 
@@ -149,72 +175,140 @@ def display_path_graph(path_graph, show_distances=True, show_names=True):
     plt.show()
 
 
-def viterbi(V, Tm, Em, initial_distribution=None):
+def viterbi(V, Tm, Em, initial_distribution=None, dtype=np.float64, report=None):
     """Implementation of the Viterbi algorithm.
 
+    Only the states that can emit the observation at each step are scored, so the work
+    per step is limited to the active states of the previous and current observations.
+
     Args:
         V (list): Sequence of observations.
         Tm (np.ndarray): Transition matrix
         Em (np.ndarray): Emission matrix
         initial_distribution (list, optional): Initial distribution. Defaults to uniform.
+        dtype (np.dtype, optional): Float type of the score buffers. Defaults to np.float64.
+        report (dict, optional): Filled with the size in bytes of each decoder buffer, see layered_viterbi.
 
     Returns:
         np.ndarray: Most likely sequence of hidden state indices
     """
-    T = len(V)
     M = Tm.shape[0]
 
     initial_distribution = initial_distribution if initial_distribution is not None else np.full(M, 1 / M)
+    initial_distribution = np.asarray(initial_distribution)
+
+    active_states = {v: np.flatnonzero(Em[:, v]) for v in set(V)}
+    layers = [active_states[v] for v in V]
+
+    def log_transition_block(t):
+        previous_states, states = layers[t - 1], layers[t]
+        return np.log(Tm[np.ix_(previous_states, states)]) + np.log(Em[states, V[t]])
+
+    with np.errstate(divide="ignore"):
+        log_initial = np.log(initial_distribution[layers[0]]) + np.log(Em[layers[0], V[0]])
+        return layered_viterbi(layers, log_transition_block, log_initial, dtype, report)
+
+
+def layered_viterbi(layers, log_transition_block, log_initial, dtype=np.float64, report=None):
+    """Runs the Viterbi algorithm over layers of candidate states.
+
+    Each time step only holds the states that can be active at that step, and only the
+    blocks between two consecutive layers are scored. The cost is therefore the sum of
+    k_{t-1} * k_t over the sequence instead of T * M^2 for the full state space.
 
-    log_Tm = np.log(Tm)
-    log_Em = np.log(Em)
+    Args:
+        layers (list): One array of candidate state indices per time step
+        log_transition_block (callable): Returns, for a step t >= 1, the log-score block of shape
+            (len(layers[t-1]), len(layers[t])), emission scores of layers[t] included
+        log_initial (np.ndarray): Log-scores of the states of layers[0]
+        dtype (np.dtype, optional): Float type of the score buffers. Defaults to np.float64.
+        report (dict, optional): Filled with the size in bytes of each decoder buffer: "omega" and
+            "scores" (largest per-step buffers) and "prev" (backpointers kept for the whole sequence)
+
+    Returns:
+        np.ndarray: Most likely sequence of hidden state indices
+    """
+    T = len(layers)
+    backpointer_dtype = backpointer_dtype_for(max(len(layer) for layer in layers))
+
+    omega = np.asarray(log_initial, dtype=dtype)
+    prev = []
+    buffers = {"omega": omega.nbytes, "scores": 0, "prev": 0}
 
-    omega = np.zeros((T, M))
-    omega[0, :] = np.log(initial_distribution) + log_Em[:, V[0]]
+    with np.errstate(divide="ignore"):
+        for t in range(1, T):
+            # scores[i, j] = omega[i] + log_Tm[i, j] + log_Em[j, V[t]], restricted to the two layers
+            scores = omega[:, np.newaxis] + np.asarray(log_transition_block(t), dtype=dtype)
+            prev.append(np.argmax(scores, axis=0).astype(backpointer_dtype))
+            omega = np.max(scores, axis=0)
 
-    prev = np.zeros((T - 1, M))
+            buffers["omega"] = max(buffers["omega"], omega.nbytes)
+            buffers["scores"] = max(buffers["scores"], scores.nbytes)
+            buffers["prev"] += prev[-1].nbytes
 
-    for t in range(1, T):
-        # scores[i, j] = omega[t-1][i] + log_Tm[i, j] + log_Em[j, V[t]]
-        scores = omega[t - 1, :, np.newaxis] + log_Tm + log_Em[:, V[t]]
-        prev[t - 1] = np.argmax(scores, axis=0)
-        omega[t] = np.max(scores, axis=0)
+    if report is not None:
+        report.update(buffers)
 
-    S = np.zeros(T)
-    last_state = np.argmax(omega[T - 1, :])
-    S[0] = last_state
+    S = np.zeros(T, dtype=int)
+    last_state = int(np.argmax(omega))
+    S[T - 1] = layers[T - 1][last_state]
 
-    backtrack_index = 1
-    for i in range(T - 2, -1, -1):
-        S[backtrack_index] = prev[i, int(last_state)]
-        last_state = prev[i, int(last_state)]
-        backtrack_index += 1
+    for t in range(T - 2, -1, -1):
+        last_state = int(prev[t][last_state])
+        S[t] = layers[t][last_state]
 
-    return np.flip(S, axis=0).astype(int)
+    return S
 
 
-def _compute_pair_easiness(curr_stats, prev_stats, weights, tuning):
-    """Computes the easiness of transitioning from a previous fingering to a current one.
+def backpointer_dtype_for(n_states):
+    """Returns the smallest unsigned integer type able to index n_states states.
 
     Args:
-        curr_stats (dict): Precomputed stats for the current fingering
-        prev_stats (dict): Precomputed stats for the previous fingering
+        n_states (int): Number of states
+
+    Returns:
+        np.dtype: Integer type for the backpointers
+    """
+    return np.min_scalar_type(max(n_states - 1, 0))
+
+
+def compute_easiness_matrix(previous_stats, stats, weights, tuning):
+    """Computes the easiness of every transition between two sets of fingerings at once.
+
+    The height and span scores only depend on the current fingering, while the position shift
+    falls back to the previous height when the current fingering only uses open strings.
+
+    Args:
+        previous_stats (dict): Precomputed stats of the previous fingerings
+        stats (dict): Precomputed stats of the current fingerings
         weights (dict): Difficulty component weights
         tuning (Tuning): Instrument tuning
 
     Returns:
-        float: Easiness value (higher = easier transition)
+        np.ndarray: Easiness of shape (n_previous, n_current) (higher = easier transition)
     """
-    curr_rh = curr_stats["raw_height"] if curr_stats["raw_height"] != 0 else prev_stats["raw_height"]
-    dheight = get_dheight_score(curr_rh, prev_stats["raw_height"], tuning)
-    n_changed = (curr_stats["n_notes"] - len(curr_stats["all_strings"] & prev_stats["non_open_strings"])) / tuning.nstrings
+    b = weights["b"]
+
+    # Position shift; an all-open fingering keeps the hand where the previous one was
+    curr_rh = stats["raw_height"]
+    dheight = np.abs(curr_rh[np.newaxis, :] - previous_stats["raw_height"][:, np.newaxis])
+    dheight[:, curr_rh == 0] = 0
+    easiness = np.exp(dheight * (-1 / (b * tuning.nfrets)), out=dheight)
 
-    return (
-        laplace_distro(dheight, b=weights["b"])
-        * 1 / (1 + curr_stats["height_score"] * weights["height"])
-        * 1 / (1 + curr_stats["span_score"] * weights["length"])
-        * 1 / (1 + n_changed * weights["n_changed_strings"])
-    )
+    # Terms that only depend on the current fingering
+    easiness *= (
+        (1 / (2 * b))
+        / (1 + stats["height_score"] * weights["height"])
+        / (1 + stats["span_score"] * weights["length"])
+    )[np.newaxis, :]
+
+    # Changed strings, looked up by number of strings changed
+    kept_strings = count_set_bits(stats["all_strings"][np.newaxis, :] & previous_stats["non_open_strings"][:, np.newaxis], tuning.nstrings)
+    n_changed = np.subtract(stats["n_notes"][np.newaxis, :], kept_strings, out=kept_strings)
+    changed_factor = 1 / (1 + np.arange(tuning.nstrings + 1) / tuning.nstrings * weights["n_changed_strings"])
+    easiness *= changed_factor[n_changed]
+
+    return easiness
 
 
 def build_transition_matrix(positions, fingerings, weights, tuning):
@@ -229,28 +323,538 @@ def build_transition_matrix(positions, fingerings, weights, tuning):
     Returns:
         np.ndarray: Transition matrix of shape (n_fingerings, n_fingerings)
     """
-    n = len(fingerings)
     stats = precompute_fingering_stats(positions, fingerings, tuning)
-    transition_matrix = np.zeros((n, n))
-    for iprevious in range(n):
-        easiness = np.array([
-            _compute_pair_easiness(stats[icurrent], stats[iprevious], weights, tuning)
-            for icurrent in range(n)
-        ])
-        transition_matrix[iprevious] = difficulties_to_probabilities(easiness)
-    return transition_matrix
+    return difficulties_to_probabilities(compute_easiness_matrix(stats, stats, weights, tuning))
+
+
+class FixedLagViterbi:
+    """Viterbi decoder over a stream of layers with a bounded decision delay.
+
+    Each state keeps its survivor path over the uncommitted steps only. A step is committed
+    as soon as all surviving paths agree on it, which gives the exact Viterbi decision, or
+    when more than `lag` steps are pending, in which case the best current path decides and
+    the states that disagree with it are dropped. Memory is bounded by the lag instead of
+    the length of the stream.
+    """
+
+    def __init__(self, lag, dtype=np.float64, state_dtype=np.int64):
+        """Constructor for the FixedLagViterbi object.
+
+        Args:
+            lag (int): Maximum number of steps kept undecided
+            dtype (np.dtype, optional): Float type of the score buffers. Defaults to np.float64.
+            state_dtype (np.dtype, optional): Integer type of the survivor paths, able to index the
+                states of any layer. Defaults to np.int64.
+        """
+        self.lag = lag
+        self.dtype = dtype
+        self.state_dtype = state_dtype
+        self.buffers = {"omega": 0, "scores": 0, "paths": 0}  # Largest size in bytes of each buffer
+        self._layers = deque()
+        self._omega = None
+        self._paths = None
+
+    def push(self, layer, log_scores):
+        """Adds a time step to the stream.
+
+        Args:
+            layer (np.ndarray): Candidate state indices of the step
+            log_scores (np.ndarray): Log-scores of the states for the first step, then the
+                (len(previous_layer), len(layer)) log-score block from the previous step
+
+        Returns:
+            list: State indices committed by this step, in time order
+        """
+        current = np.arange(len(layer), dtype=self.state_dtype)[:, np.newaxis]
+        if self._omega is None:
+            self._omega = np.asarray(log_scores, dtype=self.dtype)
+            self._paths = current
+        else:
+            with np.errstate(divide="ignore"):
+                scores = self._omega[:, np.newaxis] + np.asarray(log_scores, dtype=self.dtype)
+            best_previous = np.argmax(scores, axis=0)
+            self._omega = np.max(scores, axis=0)
+            self._paths = np.hstack((self._paths[best_previous], current))
+            self.buffers["scores"] = max(self.buffers["scores"], scores.nbytes)
+        self._layers.append(layer)
+        self.buffers["omega"] = max(self.buffers["omega"], self._omega.nbytes)
+        self.buffers["paths"] = max(self.buffers["paths"], self._paths.nbytes)
+
+        return self._commit()
+
+    def flush(self):
+        """Commits all pending steps along the best current path.
+
+        Returns:
+            list: Remaining state indices, in time order
+        """
+        if self._omega is None:
+            return []
+        best_path = self._paths[int(np.argmax(self._omega))]
+        committed = [int(layer[state]) for layer, state in zip(self._layers, best_path)]
+        self._layers.clear()
+        self._omega = None
+        self._paths = None
+        return committed
+
+    def _commit(self):
+        """Commits converged steps, then forces decisions older than the lag."""
+        committed = []
+        alive = np.isfinite(self._omega)
+        while self._paths.shape[1] > 0:
+            oldest = self._paths[alive, 0] if np.any(alive) else self._paths[:, 0]
+            if np.all(oldest == oldest[0]):
+                state = oldest[0]
+            elif self._paths.shape[1] > self.lag:
+                state = self._paths[int(np.argmax(self._omega)), 0]
+                self._omega[self._paths[:, 0] != state] = -np.inf
+                alive = np.isfinite(self._omega)
+            else:
+                break
+            committed.append(int(self._layers.popleft()[state]))
+            self._paths = self._paths[:, 1:]
+        return committed
+
+
+def stream_chord_sequence(observations, chord_states, transitions, initial_distribution, lag, dtype=np.float64,
+                          report=None):
+    """Decodes a stream of observed chords with a fixed-lag Viterbi decoder.
+
+    Args:
+        observations (iterable): Observed chord indices, possibly unbounded
+        chord_states (list): Fingering indices of each chord of the vocabulary
+        transitions (TransitionProvider): Provider of the transition blocks between chords
+        initial_distribution (np.ndarray): Initial distribution over all fingerings
+        lag (int): Maximum number of chords kept undecided
+        dtype (np.dtype, optional): Float type of the score buffers. Defaults to np.float64.
+        report (dict, optional): Kept filled with the largest size in bytes of each decoder buffer:
+            "omega", "scores" and "paths" (survivor paths over the pending chords)
+
+    Yields:
+        int: Committed fingering indices, one per observed chord, in order
+    """
+    state_dtype = backpointer_dtype_for(max((len(states) for states in chord_states), default=1))
+    decoder = FixedLagViterbi(lag, dtype, state_dtype)
+    previous_chord = None
+    for chord in observations:
+        with np.errstate(divide="ignore"):
+            if previous_chord is None:
+                log_scores = np.log(np.asarray(initial_distribution)[chord_states[chord]])
+            else:
+                log_scores = np.log(transitions.block(previous_chord, chord))
+        committed = decoder.push(chord_states[chord], log_scores)
+        if report is not None:
+            report.update(decoder.buffers)
+        yield from committed
+        previous_chord = chord
+    yield from decoder.flush()
+
+
+EQUIVALENCE_FEATURES = ("raw_height", "span_score", "n_notes", "all_strings", "non_open_strings")
+
+
+def collapse_equivalent_fingerings(stats, chord_states):
+    """Groups the fingerings of each chord into classes with identical transition features.
+
+    The transition easiness only depends on the raw height, span, number of notes and string sets
+    of the two fingerings, so fingerings of a chord sharing all of them are interchangeable for
+    decoding. Each class is represented by its first fingering.
+
+    Args:
+        stats (dict): Stats of all fingerings, see precompute_fingering_stats
+        chord_states (list): Fingering indices of each chord of the vocabulary
+
+    Returns:
+        tuple: (class_states, class_counts), per chord the representative fingering index of each
+               class, in vocabulary order, and the number of fingerings in each class
+    """
+    class_states, class_counts = [], []
+    for states in chord_states:
+        features = np.stack([stats[feature][states].astype(float) for feature in EQUIVALENCE_FEATURES], axis=1)
+        _, first, counts = np.unique(features, axis=0, return_index=True, return_counts=True)
+        order = np.argsort(first)
+        class_states.append(states[first[order]])
+        class_counts.append(counts[order])
+    return class_states, class_counts
+
+
+class TransitionProvider:
+    """Computes transition blocks on demand between the fingerings of two consecutive chords.
+
+    Only the (chord, next chord) pairs that actually follow each other in the piece are
+    ever computed, and each block is memoized. A block holds the rows of the dense transition
+    matrix of build_transition_matrix restricted to the fingerings of the next chord: each row
+    is normalised over the fingerings of every chord of the vocabulary. The normaliser of a
+    fingering is computed once, the first time it appears as a previous state, and reused by
+    every block it is a row of.
+
+    When the states of a chord are fingering classes (see collapse_equivalent_fingerings), each
+    class is weighted by its number of members in the normalisation, so that the probability of
+    a class equals that of any of its fingerings in the uncollapsed model.
+    """
+
+    def __init__(self, stats, chord_states, weights, tuning, chord_counts=None):
+        """Constructor for the TransitionProvider object.
+
+        Args:
+            stats (dict): Stats of all fingerings that can appear in the piece, see precompute_fingering_stats
+            chord_states (list): Fingering indices of each chord of the vocabulary
+            weights (dict): Difficulty component weights
+            tuning (Tuning): Instrument tuning
+            chord_counts (list, optional): Number of fingerings represented by each state of each chord.
+                Defaults to None (one fingering per state).
+        """
+        self.chord_states = chord_states
+        self.chord_counts = chord_counts
+        self.weights = weights
+        self.tuning = tuning
+        self.n_fingerings = len(stats["n_notes"])
+        self._stats = stats
+        self._blocks = {}
+        self.counters = {
+            "blocks_computed": 0, "block_hits": 0, "cells_computed": 0, "row_totals_computed": 0,
+            "row_total_cells_computed": 0,
+        }
+
+        all_states = np.concatenate(chord_states) if len(chord_states) > 0 else np.zeros(0, dtype=int)
+        self._all_stats = select_fingering_stats(stats, all_states)
+        self._all_counts = np.concatenate(chord_counts) if chord_counts is not None else np.ones(len(all_states))
+        self._row_totals = np.full(self.n_fingerings, np.nan)
+
+    def block(self, previous_chord, chord, rows=None):
+        """Returns the transition probabilities from the fingerings of a chord to those of the next one.
+
+        Args:
+            previous_chord (int): Vocabulary index of the previous chord
+            chord (int): Vocabulary index of the next chord
+            rows (np.ndarray, optional): Positions, among the states of the previous chord, of the only
+                rows to compute. Such partial blocks are not memoized. Defaults to None (every row).
+
+        Returns:
+            np.ndarray: Block of shape (n_previous_fingerings or len(rows), n_fingerings)
+        """
+        key = (previous_chord, chord)
+        if key in self._blocks:
+            self.counters["block_hits"] += 1
+            return self._blocks[key] if rows is None else self._blocks[key][rows]
+
+        previous_states, states = self.chord_states[previous_chord], self.chord_states[chord]
+        if rows is not None:
+            previous_states = previous_states[rows]
+
+        easiness = compute_easiness_matrix(
+            select_fingering_stats(self._stats, previous_states),
+            select_fingering_stats(self._stats, states),
+            self.weights,
+            self.tuning,
+        )
+        transition_block = easiness / self._get_row_totals(previous_states)[:, np.newaxis]
+
+        self.counters["cells_computed"] += transition_block.size
+        if rows is None:
+            self.counters["blocks_computed"] += 1
+            self._blocks[key] = transition_block
+        return transition_block
+
+    def _get_row_totals(self, previous_states, max_cells=1 << 22):
+        """Returns the total easiness from each fingering to every fingering of the vocabulary.
+
+        Totals are computed once per fingering, over column chunks of at most max_cells cells.
+        """
+        missing = np.unique(previous_states[np.isnan(self._row_totals[previous_states])])
+        if len(missing) > 0:
+            missing_stats = select_fingering_stats(self._stats, missing)
+            totals = np.zeros(len(missing))
+            chunk = max(1, max_cells // len(missing))
+            for start in range(0, len(self._all_counts), chunk):
+                columns = slice(start, start + chunk)
+                column_stats = {key: values[columns] for key, values in self._all_stats.items()}
+                totals += compute_easiness_matrix(missing_stats, column_stats, self.weights, self.tuning) @ self._all_counts[columns]
+            self._row_totals[missing] = totals
+            self.counters["row_totals_computed"] += len(missing)
+            self.counters["row_total_cells_computed"] += len(missing) * len(self._all_counts)
+        return self._row_totals[previous_states]
+
+    @property
+    def cells_skipped(self):
+        """Number of easiness evaluations saved compared to the dense transition matrix.
+
+        Both the block cells and the row total cells are evaluations, so this is negative when
+        the blocks and row totals together evaluate more cells than the dense matrix holds.
+        """
+        return self.n_fingerings ** 2 - self.counters["cells_computed"] - self.counters["row_total_cells_computed"]
+
+
+def decode_chord_sequence(V, chord_states, transitions, initial_distribution, decoder="viterbi",
+                          beam_width=DEFAULT_BEAM_WIDTH, dtype=np.float64, report=None):
+    """Finds the most likely fingering sequence for a sequence of observed chords.
+
+    Args:
+        V (list): Sequence of observed chord indices
+        chord_states (list): Fingering indices of each chord of the vocabulary
+        transitions (TransitionProvider): Provider of the transition blocks between chords
+        initial_distribution (np.ndarray): Initial distribution over all fingerings
+        decoder (str, optional): "viterbi" for the exact decoder, "beam" for beam search. Defaults to "viterbi".
+        beam_width (int, optional): Number of partial paths kept by the beam decoder. Defaults to DEFAULT_BEAM_WIDTH.
+        dtype (np.dtype, optional): Float type of the score buffers. Defaults to np.float64.
+        report (dict, optional): Filled with the size in bytes of each decoder buffer.
+
+    Returns:
+        np.ndarray: Most likely sequence of fingering indices
+    """
+    layers, log_transition_block, log_initial = _chord_layers(V, chord_states, transitions, initial_distribution)
+
+    if decoder == "viterbi":
+        return layered_viterbi(layers, log_transition_block, log_initial, dtype, report)
+    if decoder == "beam":
+        return beam_search(layers, log_transition_block, log_initial, beam_width, dtype, report)
+    raise ValueError(f"Unknown decoder: {decoder}")
+
+
+def _chord_layers(V, chord_states, transitions, initial_distribution):
+    """Returns the layers, log transition blocks and initial log-scores of a chord sequence."""
+    layers = [chord_states[v] for v in V]
+
+    def log_transition_block(t, rows=None):
+        return np.log(transitions.block(V[t - 1], V[t], rows))
+
+    with np.errstate(divide="ignore"):
+        log_initial = np.log(np.asarray(initial_distribution)[layers[0]])
+    return layers, log_transition_block, log_initial
+
+
+def beam_search(layers, log_transition_block, log_initial, width, dtype=np.float64, report=None):
+    """Approximate Viterbi keeping only the best partial paths at each time step.
+
+    Only the `width` best states of a layer are extended to the next one, and only their rows of
+    each transition block are requested, so the decoder itself costs O(T * width * k) instead of
+    O(T * k^2). With a TransitionProvider, each fingering entering a beam for the first time also
+    costs one pass over the vocabulary to compute its row total.
+
+    Args:
+        layers (list): One array of candidate state indices per time step
+        log_transition_block (callable): Returns, for a step t >= 1 and positions rows among the states
+            of layers[t-1], the log-score block of shape (len(rows), len(layers[t])), emission scores of
+            layers[t] included
+        log_initial (np.ndarray): Log-scores of the states of layers[0]
+        width (int): Number of partial paths kept per time step
+        dtype (np.dtype, optional): Float type of the score buffers. Defaults to np.float64.
+        report (dict, optional): Filled with the size in bytes of each decoder buffer, as in
+            layered_viterbi, plus "beams" (beam state indices kept for the whole sequence)
+
+    Returns:
+        np.ndarray: Sequence of hidden state indices of the best path found
+    """
+    T = len(layers)
+    state_dtype = backpointer_dtype_for(max(len(layer) for layer in layers))
+    backpointer_dtype = backpointer_dtype_for(width)
+
+    omega = np.asarray(log_initial, dtype=dtype)
+    beam = np.argsort(-omega, kind="stable")[:width].astype(state_dtype)
+    omega = omega[beam]
+    beams = [beam]
+    prev = []
+    buffers = {"omega": omega.nbytes, "scores": 0, "prev": 0, "beams": beam.nbytes}
+
+    with np.errstate(divide="ignore"):
+        for t in range(1, T):
+            scores = omega[:, np.newaxis] + np.asarray(log_transition_block(t, beam), dtype=dtype)
+            best_previous = np.argmax(scores, axis=0)
+            buffers["scores"] = max(buffers["scores"], scores.nbytes)
+            omega = np.max(scores, axis=0)
+
+            beam = np.argsort(-omega, kind="stable")[:width].astype(state_dtype)
+            omega = omega[beam]
+            beams.append(beam)
+            prev.append(best_previous[beam].astype(backpointer_dtype))
+
+            buffers["omega"] = max(buffers["omega"], omega.nbytes)
+            buffers["prev"] += prev[-1].nbytes
+            buffers["beams"] += beam.nbytes
+
+    if report is not None:
+        report.update(buffers)
+
+    S = np.zeros(T, dtype=int)
+    last_state = int(np.argmax(omega))
+    for t in range(T - 1, -1, -1):
+        S[t] = layers[t][beams[t][last_state]]
+        if t > 0:
+            last_state = int(prev[t - 1][last_state])
+
+    return S
+
+
+def score_chord_path(V, path, chord_states, transitions, initial_distribution):
+    """Returns the log-score of a fingering sequence under the chord model.
+
+    Args:
+        V (list): Sequence of observed chord indices
+        path (np.ndarray): Fingering index chosen for each chord
+        chord_states (list): Fingering indices of each chord of the vocabulary
+        transitions (TransitionProvider): Provider of the transition blocks between chords
+        initial_distribution (np.ndarray): Initial distribution over all fingerings
+
+    Returns:
+        float: Log-score of the path
+    """
+    local = [int(np.searchsorted(chord_states[v], state)) for v, state in zip(V, path)]
+    with np.errstate(divide="ignore"):
+        score = np.log(initial_distribution[path[0]])
+        for t in range(1, len(V)):
+            score += np.log(transitions.block(V[t - 1], V[t])[local[t - 1], local[t]])
+    return float(score)
+
+
+def beam_search_gap(V, chord_states, transitions, initial_distribution, beam_width=DEFAULT_BEAM_WIDTH):
+    """Compares the beam decoder with exact Viterbi on the same input.
+
+    Args:
+        V (list): Sequence of observed chord indices
+        chord_states (list): Fingering indices of each chord of the vocabulary
+        transitions (TransitionProvider): Provider of the transition blocks between chords
+        initial_distribution (np.ndarray): Initial distribution over all fingerings
+        beam_width (int, optional): Number of partial paths kept by the beam decoder. Defaults to DEFAULT_BEAM_WIDTH.
+
+    Returns:
+        dict: Log-scores of both decodes ("viterbi_score", "beam_score"), their difference ("gap",
+              never negative) and the number of chords fingered differently ("n_differences")
+    """
+    exact = decode_chord_sequence(V, chord_states, transitions, initial_distribution)
+    approximate = decode_chord_sequence(V, chord_states, transitions, initial_distribution, "beam", beam_width)
+    viterbi_score = score_chord_path(V, exact, chord_states, transitions, initial_distribution)
+    beam_score = score_chord_path(V, approximate, chord_states, transitions, initial_distribution)
+    return {
+        "viterbi_score": viterbi_score,
+        "beam_score": beam_score,
+        "gap": viterbi_score - beam_score,
+        "n_differences": int(np.sum(exact != approximate)),
+    }
+
+
+def decode_chord_segments(V, chord_states, stats, weights, tuning, initial_distribution, anchors,
+                          overlap=DEFAULT_SEGMENT_OVERLAP, min_segment_length=DEFAULT_MIN_SEGMENT_LENGTH,
+                          max_workers=None, decoder="viterbi",
+                          beam_width=DEFAULT_BEAM_WIDTH, chord_counts=None, dtype=np.float64, report=None):
+    """Decodes a chord sequence segment by segment across a process pool.
+
+    The sequence is cut at the given anchors, keeping segments of at least min_segment_length
+    chords. Each segment is decoded independently in a worker, then every seam is decoded again
+    over a window of overlap chords on each side, with both ends of the window pinned to the
+    fingerings found by the segments, so that the fingerings stay consistent across the cut.
+
+    Args:
+        V (list): Sequence of observed chord indices
+        chord_states (list): Fingering indices of each chord of the vocabulary
+        stats (dict): Stats of all fingerings, see precompute_fingering_stats
+        weights (dict): Difficulty component weights
+        tuning (Tuning): Instrument tuning
+        initial_distribution (np.ndarray): Initial distribution over all fingerings
+        anchors (list): Observation indices where the sequence may be cut
+        overlap (int, optional): Number of chords re-decoded on each side of a cut. Defaults to DEFAULT_SEGMENT_OVERLAP.
+        min_segment_length (int, optional): Minimum number of chords per segment. Defaults to DEFAULT_MIN_SEGMENT_LENGTH.
+        max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        decoder (str, optional): Decoder used for the segments, see decode_chord_sequence. Defaults to "viterbi".
+        beam_width (int, optional): Number of partial paths kept by the beam decoder. Defaults to DEFAULT_BEAM_WIDTH.
+        chord_counts (list, optional): Number of fingerings represented by each state, see TransitionProvider.
+        dtype (np.dtype, optional): Float type of the score buffers. Defaults to np.float64.
+        report (dict, optional): Filled with the size in bytes of each decoder buffer of the largest
+            segment, see decode_chord_sequence.
+
+    Returns:
+        np.ndarray: Sequence of fingering indices
+    """
+    cuts = []
+    for anchor in sorted(set(anchors)):
+        if anchor - (cuts[-1] if cuts else 0) >= min_segment_length and len(V) - anchor >= min_segment_length:
+            cuts.append(anchor)
+
+    transitions = TransitionProvider(stats, chord_states, weights, tuning, chord_counts)
+    if len(cuts) == 0:
+        return decode_chord_sequence(V, chord_states, transitions, initial_distribution, decoder, beam_width, dtype, report)
+
+    bounds = [0] + cuts + [len(V)]
+    tasks = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        first_states = chord_states[V[start]]
+        segment_initial = np.zeros(len(initial_distribution))
+        segment_initial[first_states] = initial_distribution[first_states] if start == 0 else 1 / len(first_states)
+        tasks.append((
+            V[start:end], chord_states, stats, weights, tuning, segment_initial, decoder, beam_width, chord_counts, dtype,
+        ))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        segments = list(executor.map(_decode_segment, tasks))
+    path = np.concatenate([segment_path for segment_path, _ in segments])
+    if report is not None:
+        for _, buffers in segments:
+            report.update({name: max(size, report.get(name, 0)) for name, size in buffers.items()})
+
+    for cut in cuts:
+        low, high = max(cut - overlap, 0), min(cut + overlap, len(V) - 1)
+        path[low:high + 1] = _decode_pinned_window(
+            V[low:high + 1], chord_states, transitions, path[low], path[high], dtype
+        )
+
+    return path
+
+
+def _decode_segment(task):
+    """Decodes one segment of a chord sequence in a worker process.
+
+    Args:
+        task (tuple): (V, chord_states, stats, weights, tuning, initial_distribution, decoder, beam_width,
+            chord_counts, dtype)
+
+    Returns:
+        tuple: (path, buffers), the sequence of fingering indices of the segment and the size in bytes
+               of each decoder buffer
+    """
+    V, chord_states, stats, weights, tuning, initial_distribution, decoder, beam_width, chord_counts, dtype = task
+    transitions = TransitionProvider(stats, chord_states, weights, tuning, chord_counts)
+    buffers = {}
+    path = decode_chord_sequence(V, chord_states, transitions, initial_distribution, decoder, beam_width, dtype, buffers)
+    return path, buffers
+
+
+def _decode_pinned_window(V, chord_states, transitions, first_state, last_state, dtype=np.float64):
+    """Decodes a window of chords whose first and last fingerings are fixed.
+
+    Args:
+        V (list): Observed chord indices of the window
+        chord_states (list): Fingering indices of each chord of the vocabulary
+        transitions (TransitionProvider): Provider of the transition blocks between chords
+        first_state (int): Fingering index imposed on the first chord
+        last_state (int): Fingering index imposed on the last chord
+        dtype (np.dtype, optional): Float type of the score buffers. Defaults to np.float64.
+
+    Returns:
+        np.ndarray: Sequence of fingering indices of the window
+    """
+    layers = [chord_states[v] for v in V]
+    layers[0] = np.array([first_state])
+    layers[-1] = np.array([last_state])
+    local = [np.searchsorted(chord_states[v], layer) for v, layer in zip(V, layers)]
+
+    def log_transition_block(t):
+        return np.log(transitions.block(V[t - 1], V[t])[np.ix_(local[t - 1], local[t])])
+
+    return layered_viterbi(layers, log_transition_block, np.zeros(1), dtype)
 
 
 def difficulties_to_probabilities(difficulties):
     """Normalises a difficulty array into a probability distribution.
 
+    Two-dimensional arrays are normalised row by row.
+
     Args:
         difficulties (np.ndarray): Array of difficulty values
 
     Returns:
         np.ndarray: Normalised probability array
     """
-    total = np.sum(difficulties)
+    difficulties = np.asarray(difficulties)
+    total = np.sum(difficulties, axis=-1, keepdims=difficulties.ndim > 1)
     return difficulties / total
 
 
@@ -1,3 +1,5 @@
+from bisect import bisect_left
+import numpy as np
 import pretty_midi
 import tuttut.logic.theory as theory
 # from app.graph_utils import 
@@ -28,13 +30,77 @@ def get_notes_between(midi, notes, begin, end):
   Returns:
       list: Notes between the lower and upper bounds
   """
-  res = []
-  for note in notes:
-    note_start_ticks = midi.time_to_tick(note.start)
-    if note_start_ticks >= begin and note_start_ticks < end:
-      res.append(note)
+  note_start_ticks = times_to_ticks(midi, [note.start for note in notes])
+  inside = (note_start_ticks >= begin) & (note_start_ticks < end)
+  return [note for note, keep in zip(notes, inside) if keep]
 
-  return res
+def get_tempo_table(midi):
+  """Returns the tempo changes of a MIDI file as arrays.
+
+  Args:
+      midi (pretty_midi.PrettyMIDI): MIDI object
+
+  Returns:
+      tuple: (start_ticks, start_times, tick_scales) of each tempo change, tick_scales being in seconds per tick
+  """
+  start_ticks = np.array([tick for tick, _ in midi._tick_scales], dtype=np.int64)
+  tick_scales = np.array([scale for _, scale in midi._tick_scales], dtype=np.float64)
+  start_times = np.zeros(len(start_ticks))
+  for i in range(1, len(start_ticks)):
+    # Same accumulation as pretty_midi, so that tick times match it bit for bit
+    start_times[i] = start_times[i-1] + tick_scales[i-1] * (start_ticks[i] - start_ticks[i-1])
+  return start_ticks, start_times, tick_scales
+
+def ticks_to_times(midi, ticks, tempo_table = None):
+  """Converts absolute ticks to times in seconds, like midi.tick_to_time for many ticks at once.
+
+  Args:
+      midi (pretty_midi.PrettyMIDI): MIDI object
+      ticks (array-like): Absolute ticks
+      tempo_table (tuple, optional): Tempo table returned by get_tempo_table. Defaults to None (computed).
+
+  Returns:
+      np.ndarray: Time of each tick in seconds
+  """
+  start_ticks, start_times, tick_scales = get_tempo_table(midi) if tempo_table is None else tempo_table
+  ticks = np.asarray(ticks, dtype=np.int64)
+  segment = np.maximum(np.searchsorted(start_ticks, ticks, side="right") - 1, 0)
+  return start_times[segment] + tick_scales[segment] * (ticks - start_ticks[segment])
+
+def times_to_ticks(midi, times, tempo_table = None):
+  """Converts times in seconds to the nearest absolute ticks, like midi.time_to_tick for many times at once.
+
+  The tempo map is searched once for all the times. Ties between two ticks go to the later one,
+  as in midi.time_to_tick for times within its precomputed tick table. Past that table, which is
+  every time after tick 0 for a PrettyMIDI built in memory, midi.time_to_tick rounds ties half to
+  even instead, so the two can differ by one tick for times exactly halfway between two ticks.
+  The result here does not depend on that table.
+
+  Args:
+      midi (pretty_midi.PrettyMIDI): MIDI object
+      times (array-like): Times in seconds
+      tempo_table (tuple, optional): Tempo table returned by get_tempo_table. Defaults to None (computed).
+
+  Returns:
+      np.ndarray: Integer tick of each time
+  """
+  tempo_table = get_tempo_table(midi) if tempo_table is None else tempo_table
+  start_ticks, start_times, tick_scales = tempo_table
+  times = np.asarray(times, dtype=np.float64)
+
+  segment = np.maximum(np.searchsorted(start_times, times, side="right") - 1, 0)
+  ticks = np.ceil(start_ticks[segment] + (times - start_times[segment]) / tick_scales[segment]).astype(np.int64)
+  ticks = np.maximum(ticks, 0)
+
+  # Correct float rounding so that ticks is the first tick whose time is not before times
+  ticks -= (ticks > 0) & (ticks_to_times(midi, np.maximum(ticks - 1, 0), tempo_table) >= times)
+  ticks += ticks_to_times(midi, ticks, tempo_table) < times
+
+  previous_closer = (ticks > 0) & (
+    np.abs(times - ticks_to_times(midi, np.maximum(ticks - 1, 0), tempo_table))
+    < np.abs(times - ticks_to_times(midi, ticks, tempo_table))
+  )
+  return ticks - previous_closer
 
 def get_non_drum(instruments):
   """Returns all instruments that are non-drums.
@@ -92,14 +158,17 @@ def quantize(midi):
       midi (pretty_midi.PrettyMIDI): MIDI object to quantize
   """
   quantization_factor = 32
+  tempo_table = get_tempo_table(midi)
   
   for instrument in midi.instruments:
-      quantized_notes = []
-      for note in instrument.notes:
-          rounded = round_to_multiple(midi.time_to_tick(note.start), base=midi.resolution/quantization_factor)
-          quantized_notes.append(pretty_midi.Note(velocity = note.velocity, pitch = note.pitch, start = midi.tick_to_time(rounded), end=note.end))
-
-      instrument.notes = quantized_notes
+      start_ticks = times_to_ticks(midi, [note.start for note in instrument.notes], tempo_table)
+      rounded = [round_to_multiple(tick, base=midi.resolution/quantization_factor) for tick in start_ticks.tolist()]
+      start_times = ticks_to_times(midi, rounded, tempo_table).tolist()
+
+      instrument.notes = [
+          pretty_midi.Note(velocity = note.velocity, pitch = note.pitch, start = start, end=note.end)
+          for note, start in zip(instrument.notes, start_times)
+      ]
       
 def transpose_note(note, semitones):
     return theory.Note(note.pitch + semitones)
@@ -114,8 +183,35 @@ def remove_duplicate_notes(notes):
 
   return res_notes
 
+def get_chord_key(notes):
+  """Returns the canonical key of a chord: its distinct pitches in ascending order.
+
+  Args:
+      notes (list): Notes of the chord
+
+  Returns:
+      tuple: Sorted distinct MIDI pitches
+  """
+  return tuple(sorted(set(note.pitch for note in notes)))
+
 def sort_notes_by_pitch(notes):
   return sorted(notes, key = lambda n: n.pitch)
 
-def get_events_between(timeline, start_ticks, end_ticks):
-    return {key: timeline[key] for key in timeline.keys() if start_ticks <= key < end_ticks}
\ No newline at end of file
+def get_events_between(timeline, start_ticks, end_ticks, ticks = None):
+  """Returns the timeline events in [start_ticks, end_ticks).
+
+  Args:
+      timeline (dict): Events keyed by tick
+      start_ticks (int): First tick of the range
+      end_ticks (int): Tick following the range
+      ticks (list, optional): Sorted ticks of the timeline. When given, the range is found by
+          bisection instead of scanning the whole timeline. Defaults to None.
+
+  Returns:
+      dict: Events of the range keyed by tick, in increasing tick order when ticks is given
+  """
+  if ticks is None:
+    return {key: timeline[key] for key in timeline.keys() if start_ticks <= key < end_ticks}
+
+  first, last = bisect_left(ticks, start_ticks), bisect_left(ticks, end_ticks)
+  return {key: timeline[key] for key in ticks[first:last]}
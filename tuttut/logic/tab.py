@@ -1,36 +1,90 @@
+import contextlib
 import math
 import numpy as np
 import json
-import os
-from collections import defaultdict
 from pathlib import Path
 from pretty_midi.containers import TimeSignature
-from tuttut.logic.theory import Measure, Note
+from tuttut.logic.theory import Measure, Note, Timeline
 from tuttut.logic.fretboard import Fretboard
-from tuttut.logic.midi_utils import measure_length_ticks, get_non_drum, fill_measure_str
-from tuttut.logic.difficulty import compute_isolated_path_difficulty
-from tuttut.logic.graph_utils import difficulties_to_probabilities, expand_emission_matrix, build_transition_matrix, viterbi
+from tuttut.logic.binary_tab import write_binary_tab
+from tuttut.logic.midi_utils import (
+    measure_length_ticks, get_non_drum, get_chord_key, get_tempo_table, ticks_to_times, times_to_ticks,
+)
+from tuttut.logic.difficulty import (
+    compute_fingering_stats, compute_isolated_difficulties, select_easiest_fingerings, get_sequence_difficulty,
+)
+from tuttut.logic.graph_utils import (
+    DEFAULT_BEAM_WIDTH, DECODERS, DEFAULT_SEGMENT_OVERLAP, DEFAULT_MIN_SEGMENT_LENGTH, difficulties_to_probabilities,
+    collapse_equivalent_fingerings, TransitionProvider, decode_chord_sequence, decode_chord_segments, stream_chord_sequence,
+)
 
 class Tab:
   """Tab object."""
-  def __init__(self, name, tuning, midi, output_dir = None, weights = None):
+  def __init__(self, name, tuning, midi, output_dir = None, weights = None, lag = None, n_workers = None,
+               decoder = "viterbi", beam_width = DEFAULT_BEAM_WIDTH, precision = "float64", fingering_store = None,
+               chord_reduction = "outer", max_fingerings = None, max_cost_ratio = None,
+               min_segment_length = DEFAULT_MIN_SEGMENT_LENGTH, segment_overlap = DEFAULT_SEGMENT_OVERLAP):
     """Constructor for the Tab object.
 
     Args:
         name (string): Name of the tab
         tuning (Tuning): Tuning of the instrument for the tab
         midi (pretty_midi.PrettyMIDI): The MIDI we're trying to convert to tab
+        lag (int, optional): Decode with a fixed-lag streaming Viterbi that commits fingerings at most
+            this many chords late. Cannot be combined with n_workers or the beam decoder.
+            Defaults to None (exact decoding over the whole piece).
+        n_workers (int, optional): Cut the piece at rests, time signature changes and measures following
+            long notes, and decode the segments across this many processes. Defaults to None (single process).
+        decoder (str, optional): "viterbi" for exact decoding or "beam" for beam search. Defaults to "viterbi".
+        beam_width (int, optional): Number of partial fingering paths kept per chord by the beam decoder.
+        precision (str, optional): Float type of the decoder score buffers, "float64" or "float32" to halve
+            their memory. Backpointers always use the smallest integer type that fits. Defaults to "float64".
+        fingering_store (FingeringStore, optional): Persistent fingering table shared between runs. Defaults to None.
+        chord_reduction (str, optional): Policy used to reduce oversized or unplayable chords to a playable
+            subset, see Fretboard.reduce_chord. None leaves them unplayed: their events keep an empty
+            list of notes and are not decoded. Defaults to "outer".
+        max_fingerings (int, optional): Keep only this many of the easiest fingerings of each chord, by
+            isolated difficulty, to bound the decoder state space. Defaults to None (keep all).
+        max_cost_ratio (float, optional): Keep only the fingerings of each chord at most this many times as
+            difficult as its easiest one. Defaults to None (keep all).
+        min_segment_length (int, optional): Minimum number of chords per segment decoded by a worker when
+            n_workers is set. Defaults to DEFAULT_MIN_SEGMENT_LENGTH.
+        segment_overlap (int, optional): Number of chords re-decoded on each side of a segment cut when
+            n_workers is set. Defaults to DEFAULT_SEGMENT_OVERLAP.
+
+    Raises:
+        ValueError: If the decoder is unknown or the decoding options cannot be combined
     """
+    if decoder not in DECODERS:
+      raise ValueError(f"Unknown decoder {decoder!r}, expected one of {DECODERS}")
+    if lag is not None and decoder != "viterbi":
+      raise ValueError(f"The fixed-lag decoder is a Viterbi decoder and cannot be combined with decoder={decoder!r}")
+    if lag is not None and n_workers is not None:
+      raise ValueError("lag and n_workers cannot be combined")
+
     self.name = name
     self.tuning = tuning
     self.time_signatures = midi.time_signature_changes if len(midi.time_signature_changes) > 0 else [TimeSignature(4, 4, 0)]
     self.nstrings = len(tuning.strings)
     self.measures = []
     self.midi = midi
-    self.fretboard = Fretboard(tuning)
+    self.fretboard = Fretboard(tuning, store=fingering_store)
     self.weights = {"b":1, "height":1, "length":1, "n_changed_strings":1} if weights is None else weights
     self.timeline = self.build_timeline()
+    self.timeline_ticks = self.timeline.ticks.tolist()
     self.output_dir = output_dir
+    self.lag = lag
+    self.n_workers = n_workers
+    self.min_segment_length = min_segment_length
+    self.segment_overlap = segment_overlap
+    self.decoder = decoder
+    self.beam_width = beam_width
+    self.precision = precision
+    self.decoder_buffers = {}
+    self.chord_reduction = chord_reduction
+    self.reduced_chords = {}
+    self.max_fingerings = max_fingerings
+    self.max_cost_ratio = max_cost_ratio
     
     self.populate()
     
@@ -38,13 +92,14 @@ class Tab:
 
   def populate(self):
     """Populates tab with Measures."""
+    # Same conversion as the timeline, so that measure bounds and event ticks agree
+    bound_times = [time_signature.time for time_signature in self.time_signatures] + [self.midi.get_end_time()]
+    bound_ticks = times_to_ticks(self.midi, bound_times, get_tempo_table(self.midi)).tolist()
+
     for i, time_signature in enumerate(self.time_signatures):
       measure_length_in_ticks = measure_length_ticks(self.midi, time_signature)
       
-      time_sig_start = self.midi.time_to_tick(time_signature.time)
-      
-      time_sig_end = self.time_signatures[i+1].time if i < len(self.time_signatures)-1 else self.midi.get_end_time()
-      time_sig_end = self.midi.time_to_tick(time_sig_end)
+      time_sig_start, time_sig_end = bound_ticks[i], bound_ticks[i+1]
       
       measure_ticks = np.arange(time_sig_start, time_sig_end, measure_length_in_ticks) #List of all the measure start ticks (ex : [0, 1024, 2048])
       
@@ -53,66 +108,66 @@ class Tab:
         self.measures.append(Measure(self, imeasure, time_signature, measure_start, measure_end))
   
   def build_timeline(self):
-    timeline = defaultdict(dict)
-    non_drum_instruments = get_non_drum(self.midi.instruments)
-    
-    #Notes
-    for instrument in non_drum_instruments:
-      notes = instrument.notes
-      notes.sort(key=lambda x: x.start)
-      
-      assert [note.start for note in notes] == sorted([note.start for note in notes]) #Are notes sorted by time
-      
-      for note in notes:
-        note_tick = self.midi.time_to_tick(note.start)
-        
-        if "notes" in timeline[note_tick]:
-          timeline[note_tick]["notes"].append(note)
-        else:
-          timeline[note_tick]["notes"] = [note]
-    
-    #Time signatures
-    for time_signature in self.time_signatures:
-      time_signature_tick = self.midi.time_to_tick(time_signature.time)
-      timeline[time_signature_tick]["time_signature"] = time_signature
-      
-    return timeline
+    """Builds the columnar timeline of the non-drum notes and of the time signatures.
+
+    Returns:
+        Timeline: Events of the MIDI keyed by tick
+    """
+    return Timeline.from_midi(self.midi, get_non_drum(self.midi.instruments), self.time_signatures)
 
   def gen_tab(self):
     """Generates the tab data and the fingerings."""
     tab = {"tuning": [string.pitch for string in self.tuning.strings], "measures": []}
 
-    notes_vocabulary, notes_sequence, fingerings_vocabulary, emission_matrix, initial_probabilities = (
+    notes_vocabulary, notes_sequence, fingerings_vocabulary, chord_ranges, initial_probabilities = (
         self._build_hmm_inputs(tab)
     )
 
     final_sequence = self._run_viterbi(
-        notes_sequence, fingerings_vocabulary, emission_matrix, initial_probabilities
+        notes_sequence, fingerings_vocabulary, chord_ranges, initial_probabilities
     )
+    self.n_fingerings = len(fingerings_vocabulary)
+    self.fingering_sequence = self.fretboard.get_fingerings_from_ids(final_sequence)
 
-    return self.populate_tab_notes(tab, final_sequence)
+    # Chords left unplayed by the reduction policy get no notes
+    fingerings = iter(self.fingering_sequence)
+    return self.populate_tab_notes(tab, [next(fingerings) if chord >= 0 else () for chord in notes_sequence])
 
   def _build_hmm_inputs(self, tab):
-    """Iterates measures to build the HMM vocabulary, observation sequence, and emission matrix.
+    """Iterates measures to build the HMM vocabulary, observation sequence, and emission model.
+
+    Chords are identified by their canonical key (sorted playable pitches), indexed in a dict so
+    that equal pitch sets always share one vocabulary entry. Oversized or unplayable chords are
+    reduced to a playable subset first, and share the entry of the reduced chord; the reductions
+    made are recorded in self.reduced_chords. Only the easiest fingerings of each chord enter the
+    vocabulary when max_fingerings or max_cost_ratio is set.
+
+    The emission model is stored as the range of fingering indices of each chord: fingerings are
+    appended to the vocabulary chord by chord, and a chord emits exactly its own fingerings. The
+    vocabulary holds the fingerings as integer node ids, see Fretboard.get_fingering_ids.
 
     Args:
         tab (dict): Tab template whose "measures" list is populated as a side effect.
 
     Returns:
         tuple: (notes_vocabulary, notes_sequence, fingerings_vocabulary,
-                emission_matrix, initial_probabilities)
+                chord_ranges, initial_probabilities), fingerings_vocabulary being an array of
+                node ids of shape (n_fingerings, max_notes), padded with -1
     """
     notes_vocabulary = []
+    chord_ids = {}
     notes_sequence = []
-    fingerings_vocabulary = []
-    emission_matrix = np.array([])
+    chord_fingering_ids = []
+    n_vocabulary_fingerings = 0
+    chord_ranges = []
     initial_probabilities = None
+    event_times = dict(zip(self.timeline_ticks, ticks_to_times(self.midi, self.timeline_ticks).tolist()))
 
     for measure in self.measures:
       res_measure = {"events": []}
       for event_tick, event_types in measure.timeline.items():
         event = {
-          "time": self.midi.tick_to_time(int(event_tick)),
+          "time": event_times[event_tick],
           "time_ticks": int(event_tick),
           "measure_timing": (event_tick - measure.measure_start) / measure.duration_ticks,
         }
@@ -123,52 +178,177 @@ class Tab:
 
         if "notes" in event_types:
           event["notes"] = []
-          notes = event_types["notes"]
-          notes_pitches = tuple(set(note.pitch for note in notes))
+          notes_pitches = sorted(set(event_types["notes"].pitch.tolist()))
           notes = self.fretboard.fix_oob_notes([Note(p) for p in notes_pitches], preserve_highest_note=False)
-          note_options = self.fretboard.get_note_options(notes)
-
-          if notes_pitches not in notes_vocabulary:
-            fingering_options = self.fretboard.get_possible_fingerings(note_options)
-            if len(fingering_options) > 0:
-              notes_vocabulary.append(notes_pitches)
-              fingerings_vocabulary += fingering_options
+          chord_key = get_chord_key(notes)
+
+          if chord_key not in chord_ids:
+            notes, fingering_options = self.fretboard.reduce_chord(notes, self.chord_reduction)
+            reduced_key = get_chord_key(notes)
+            if reduced_key != chord_key:
+              self.reduced_chords[chord_key] = reduced_key
+
+            if reduced_key in chord_ids:
+              chord_ids[chord_key] = chord_ids[reduced_key]
+            elif len(fingering_options) > 0:
+              fingering_ids, isolated = self._prune_fingerings(self.fretboard.get_fingering_ids(fingering_options))
+              chord_ids[chord_key] = chord_ids[reduced_key] = len(notes_vocabulary)
+              notes_vocabulary.append(reduced_key)
+              chord_ranges.append((n_vocabulary_fingerings, n_vocabulary_fingerings + len(fingering_ids)))
+              chord_fingering_ids.append(fingering_ids)
+              n_vocabulary_fingerings += len(fingering_ids)
               if initial_probabilities is None:
-                isolated = [compute_isolated_path_difficulty(self.fretboard.positions, p, self.tuning) for p in fingering_options]
                 initial_probabilities = difficulties_to_probabilities(isolated)
-              emission_matrix = expand_emission_matrix(emission_matrix, fingering_options)
+            else:
+              chord_ids[chord_key] = -1
 
-          if notes_pitches in notes_vocabulary:
-            notes_sequence.append(notes_vocabulary.index(notes_pitches))
-          else:
-            notes_sequence.append(-1)
+          notes_sequence.append(chord_ids[chord_key])
 
         res_measure["events"].append(event)
       tab["measures"].append(res_measure)
 
-    return notes_vocabulary, notes_sequence, fingerings_vocabulary, emission_matrix, initial_probabilities
+    if self.fretboard.store is not None:
+      self.fretboard.store.flush()
+
+    max_notes = max((ids.shape[1] for ids in chord_fingering_ids), default=0)
+    fingerings_vocabulary = np.full((n_vocabulary_fingerings, max_notes), -1, dtype=np.int16)
+    for (start, stop), ids in zip(chord_ranges, chord_fingering_ids):
+      fingerings_vocabulary[start:stop, :ids.shape[1]] = ids
+
+    return notes_vocabulary, notes_sequence, fingerings_vocabulary, chord_ranges, initial_probabilities
+
+  def _prune_fingerings(self, fingering_ids):
+    """Keeps the easiest fingerings of a chord according to max_fingerings and max_cost_ratio.
+
+    Args:
+        fingering_ids (np.ndarray): Node ids of all fingerings of the chord, see Fretboard.get_fingering_ids
+
+    Returns:
+        tuple: (fingering_ids, difficulties), the node ids of the kept fingerings, in their original
+               order, and their isolated difficulties
+    """
+    stats = compute_fingering_stats(*self.fretboard.get_node_coordinates(fingering_ids), self.tuning)
+    difficulties = compute_isolated_difficulties(stats)
+    if self.max_fingerings is None and self.max_cost_ratio is None:
+      return fingering_ids, difficulties
+
+    kept = select_easiest_fingerings(difficulties, self.max_fingerings, self.max_cost_ratio)
+    return fingering_ids[kept], difficulties[kept]
 
-  def _run_viterbi(self, notes_sequence, fingerings_vocabulary, emission_matrix, initial_probabilities):
-    """Builds the transition matrix and runs Viterbi to find the optimal fingering sequence.
+  def pruning_report(self):
+    """Compares the tab decoded from pruned fingerings with the tab decoded from every fingering.
+
+    Both fingering sequences are scored with the pairwise difficulty of compute_path_difficulty.
+
+    Returns:
+        dict: Vocabulary sizes ("n_fingerings", "n_pruned_fingerings"), total difficulty of both tabs
+              ("full_difficulty", "pruned_difficulty"), their ratio ("difficulty_ratio") and the number
+              of chords fingered differently ("n_differences")
+    """
+    full = Tab(
+        self.name, self.tuning, self.midi, output_dir=self.output_dir, weights=self.weights, lag=self.lag,
+        n_workers=self.n_workers, decoder=self.decoder, beam_width=self.beam_width, precision=self.precision,
+        fingering_store=self.fretboard.store, chord_reduction=self.chord_reduction,
+        min_segment_length=self.min_segment_length, segment_overlap=self.segment_overlap,
+    )
+    full_positions = [tuple(full.fretboard.positions[note] for note in f) for f in full.fingering_sequence]
+    pruned_positions = [tuple(self.fretboard.positions[note] for note in f) for f in self.fingering_sequence]
+
+    full_difficulty = get_sequence_difficulty(full.fretboard.positions, full.fingering_sequence, self.weights, self.tuning)
+    pruned_difficulty = get_sequence_difficulty(self.fretboard.positions, self.fingering_sequence, self.weights, self.tuning)
+    return {
+        "n_fingerings": full.n_fingerings,
+        "n_pruned_fingerings": self.n_fingerings,
+        "full_difficulty": full_difficulty,
+        "pruned_difficulty": pruned_difficulty,
+        "difficulty_ratio": pruned_difficulty / full_difficulty if full_difficulty > 0 else 1.0,
+        "n_differences": sum(f != p for f, p in zip(full_positions, pruned_positions)),
+    }
+
+  def _run_viterbi(self, notes_sequence, fingerings_vocabulary, chord_ranges, initial_probabilities):
+    """Runs Viterbi over on-demand transition blocks to find the optimal fingering sequence.
+
+    Fingerings of a chord with identical transition features are collapsed into one state, so
+    decoding scales with the number of distinct shapes; each state is decoded as its first fingering.
+    Unplayed chords (index -1) are left out of the decoded sequence.
 
     Args:
-        notes_sequence (list): Observation indices into the notes vocabulary.
-        fingerings_vocabulary (list): All fingerings that appear in the piece.
-        emission_matrix (np.ndarray): Emission matrix.
+        notes_sequence (list): Observation indices into the notes vocabulary, -1 for unplayed chords.
+        fingerings_vocabulary (np.ndarray): Node ids of all fingerings that appear in the piece.
+        chord_ranges (list): (start, stop) range of fingering indices emitted by each chord.
         initial_probabilities (np.ndarray): Initial state distribution.
 
     Returns:
-        np.ndarray: Sequence of fingerings (one per observed chord).
+        np.ndarray: Node ids of the fingering of each played chord.
     """
-    transition_matrix = build_transition_matrix(
-        self.fretboard.positions, fingerings_vocabulary, self.weights, self.tuning
+    played = np.flatnonzero(np.asarray(notes_sequence, dtype=int) >= 0)
+    notes_sequence = [notes_sequence[i] for i in played]
+    if len(notes_sequence) == 0:
+      return fingerings_vocabulary[:0]
+
+    stats = compute_fingering_stats(*self.fretboard.get_node_coordinates(fingerings_vocabulary), self.tuning)
+    chord_states, chord_counts = collapse_equivalent_fingerings(
+        stats, [np.arange(start, stop) for start, stop in chord_ranges]
     )
+    self.transitions = TransitionProvider(stats, chord_states, self.weights, self.tuning, chord_counts)
     initial_probabilities = np.hstack((
         initial_probabilities,
-        np.zeros(len(transition_matrix) - len(initial_probabilities)),
+        np.zeros(len(fingerings_vocabulary) - len(initial_probabilities)),
     ))
-    sequence_indices = viterbi(notes_sequence, transition_matrix, emission_matrix, initial_probabilities)
-    return np.array(fingerings_vocabulary, dtype=object)[sequence_indices]
+    if self.n_workers is not None:
+      sequence_indices = decode_chord_segments(
+          notes_sequence, chord_states, stats, self.weights, self.tuning, initial_probabilities,
+          np.searchsorted(played, self._find_segment_anchors()).tolist(), overlap=self.segment_overlap,
+          min_segment_length=self.min_segment_length, max_workers=self.n_workers, decoder=self.decoder,
+          beam_width=self.beam_width, chord_counts=chord_counts, dtype=np.dtype(self.precision),
+          report=self.decoder_buffers,
+      )
+    elif self.lag is None:
+      sequence_indices = decode_chord_sequence(
+          notes_sequence, chord_states, self.transitions, initial_probabilities, self.decoder, self.beam_width,
+          dtype=np.dtype(self.precision), report=self.decoder_buffers,
+      )
+    else:
+      sequence_indices = np.fromiter(
+          stream_chord_sequence(
+              notes_sequence, chord_states, self.transitions, initial_probabilities, self.lag,
+              dtype=np.dtype(self.precision), report=self.decoder_buffers,
+          ),
+          dtype=int,
+      )
+    return fingerings_vocabulary[sequence_indices]
+
+  def _find_segment_anchors(self):
+    """Finds the chords where the observation sequence can be cut for segment-parallel decoding.
+
+    A chord is an anchor when it follows a rest, starts on a time signature change, or starts a
+    measure after notes lasting at least half a measure.
+
+    Returns:
+        list: Indices into the observation sequence of the anchor chords
+    """
+    anchors = []
+    iobservation = 0
+    sounding_until = 0
+    long_note_ended = False
+
+    for measure in self.measures:
+      for event_tick, event_types in measure.timeline.items():
+        if "notes" not in event_types:
+          continue
+
+        after_rest = iobservation > 0 and event_tick > sounding_until
+        time_signature_change = iobservation > 0 and "time_signature" in event_types
+        measure_after_long_note = event_tick == measure.measure_start and long_note_ended
+        if after_rest or time_signature_change or measure_after_long_note:
+          anchors.append(iobservation)
+
+        end_ticks = event_types["notes"].end_tick
+        sounding_until = max(sounding_until, int(end_ticks.max()))
+        long_note_ended = int(end_ticks.min()) - event_tick >= measure.duration_ticks / 2
+        iobservation += 1
+
+    return anchors
 
   def populate_tab_notes(self, tab, sequence):
     """Populates the tab template with notes and their fingerings.
@@ -198,59 +378,176 @@ class Tab:
         
     return tab
 
-  def to_string(self):
-    """Generates the text for the ascii tabs.
+  def get_string_headers(self):
+    """Returns the header starting the line of each string, e.g. "E ||".
 
     Returns:
-        list: List containing tab text for each guitar string
+        list: Header of each string
     """
-    res = []
+    headers = []
     for string in self.tuning.strings:
       header = string.degree
       header += "||" if len(header)>1 else " ||"
-      res.append(header)
+      headers.append(header)
+    return headers
+
+  def iter_measure_blocks(self, measures = None):
+    """Renders measures one at a time.
+
+    Lines are padded to a common width after every event and all headers have the same width,
+    so each measure can be rendered on its own and appended to the lines rendered so far.
+
+    Args:
+        measures (iterable, optional): Measures of the tab data, possibly a generator.
+            Defaults to the measures of this tab.
+
+    Yields:
+        list: Text of the measure on each guitar string, ending with the bar line
+    """
+    measures = self.tab["measures"] if measures is None else measures
+    for measure in measures:
+      lines = [[] for _ in range(self.nstrings)]
+      lengths = [0] * self.nstrings
 
-    for measure in self.tab["measures"]:
       for ievent, event in enumerate(measure["events"]):
         if "notes" in event:
           for note in event["notes"]:
-            string, fret = note["string"], note["fret"]
-            res[string] += str(fret)
+            fret = str(note["fret"])
+            lines[note["string"]].append(fret)
+            lengths[note["string"]] += len(fret)
 
           next_event_timing = measure["events"][ievent + 1]["measure_timing"] if ievent < len(measure["events"]) - 1 else 1.0
           dashes_to_add = max(1, math.floor((next_event_timing - event["measure_timing"]) * 16))
 
-          res = fill_measure_str(res)
-
+          width = max(lengths)
           for istring in range(self.nstrings):
-            res[istring] += "-" * dashes_to_add
+            lines[istring].append("-" * (width - lengths[istring] + dashes_to_add))
+            lengths[istring] = width + dashes_to_add
+
+      yield ["".join(parts) + "|" for parts in lines]
+
+  def to_string(self):
+    """Generates the text for the ascii tabs.
+
+    Returns:
+        list: List containing tab text for each guitar string
+    """
+    lines = [[header] for header in self.get_string_headers()]
+    for block in self.iter_measure_blocks():
+      for istring, text in enumerate(block):
+        lines[istring].append(text)
+
+    return ["".join(parts) for parts in lines]
+
+  def write_ascii(self, output, measures = None, wrap = None):
+    """Writes the ascii tab to a file or text stream as measures are rendered.
+
+    Without wrapping, the tab is written as one line per string, which requires every measure
+    to be rendered first. With wrapping, measures are grouped into systems of at most wrap
+    characters per line; each system is written as soon as it is full, followed by a blank line,
+    so only one system is held in memory.
+
+    Args:
+        output (str, Path or file-like): Path of the file to write, or text stream to write to
+        measures (iterable, optional): Measures of the tab data, possibly a generator yielding them
+            as they are decoded. Defaults to the measures of this tab.
+        wrap (int, optional): Maximum number of characters per line of a system. A measure wider
+            than that gets a system of its own. Defaults to None (no wrapping).
+    """
+    headers = self.get_string_headers()
+    with _open_text_output(output) as stream:
+      system = [[header] for header in headers]
+      system_width = len(headers[0])
+      nmeasures = 0
+
+      for block in self.iter_measure_blocks(measures):
+        block_width = len(block[0])
+        if wrap is not None and nmeasures > 0 and system_width + block_width > wrap:
+          _write_system(stream, system)
+          stream.write("\n")
+          system = [[header] for header in headers]
+          system_width = len(headers[0])
+          nmeasures = 0
+
+        for istring, text in enumerate(block):
+          system[istring].append(text)
+        system_width += block_width
+        nmeasures += 1
+
+      _write_system(stream, system)
+
+  def iter_json(self, compact = False):
+    """Serializes the tab to JSON measure by measure.
+
+    The concatenated chunks are the same as json.dumps(self.tab, indent=4), or as a
+    json.dumps without whitespace in compact mode, but no more than one measure is serialized
+    at a time.
 
-      for istring in range(self.nstrings):
-        res[istring] += "|"
+    Args:
+        compact (bool, optional): Serialize without indentation or spaces. Defaults to False.
+
+    Yields:
+        str: Consecutive chunks of the JSON document
+    """
+    indent, separators = (None, (",", ":")) if compact else (4, (",", ": "))
+    key_indent, measure_indent = ("", "") if compact else ("\n" + " " * 4, "\n" + " " * 8)
+
+    def dumps(value, line_indent):
+      return json.dumps(value, indent=indent, separators=separators).replace("\n", line_indent)
+
+    yield "{"
+    for ikey, (key, value) in enumerate(self.tab.items()):
+      yield ("," if ikey > 0 else "") + key_indent + json.dumps(key) + separators[1]
+      if key != "measures" or len(value) == 0:
+        yield dumps(value, key_indent)
+        continue
+
+      yield "["
+      for imeasure, measure in enumerate(value):
+        yield ("," if imeasure > 0 else "") + measure_indent + dumps(measure, measure_indent)
+      yield key_indent + "]"
+    yield ("\n" if not compact and len(self.tab) > 0 else "") + "}"
 
-    return res
+  def to_json(self, output = None, compact = False):
+    """Exports the tab to a json file or text stream, writing it measure by measure.
 
-  def to_json(self):
-    """Exports the tab to a json file."""
+    Args:
+        output (str, Path or file-like, optional): Where to write the tab. Defaults to a .json file named
+            after the tab in the output directory, or in ./json if no output directory was given.
+        compact (bool, optional): Write without indentation or spaces. Defaults to False.
+    """
     if self.tab is None:
       return
 
-    json_object = json.dumps(self.tab, indent=4)
-
-    with open(os.path.join("json", self.name + ".json"), "w") as outfile:
-        outfile.write(json_object)
+    if output is None:
+      output_dir = "./json" if self.output_dir is None else self.output_dir
+      output = Path(output_dir, self.name).with_suffix(".json")
+    with _open_text_output(output) as stream:
+      for chunk in self.iter_json(compact):
+        stream.write(chunk)
 
   def to_ascii(self):
     """Exports the tab to a text file."""
     if self.tab is None:
       return
 
-    notes_str = self.to_string()
-
     output_dir = "./tabs" if self.output_dir is None else self.output_dir
-    with open(Path(output_dir, self.name).with_suffix(".txt"),"w") as file:
-      for string_notes in notes_str:
-        file.write(string_notes + "\n")
+    self.write_ascii(Path(output_dir, self.name).with_suffix(".txt"))
+
+  def to_binary(self, output = None):
+    """Exports the tab to a compact binary file, readable with binary_tab.BinaryTab.
+
+    Args:
+        output (str, Path or binary file-like, optional): Where to write the tab. Defaults to a .tut
+            file named after the tab in the output directory.
+    """
+    if self.tab is None:
+      return
+
+    if output is None:
+      output_dir = "./tabs" if self.output_dir is None else self.output_dir
+      output = Path(output_dir, self.name).with_suffix(".tut")
+    write_binary_tab(output, self.tab)
 
   def __repr__(self):
     """Used to print out the tab.
@@ -258,4 +555,19 @@ class Tab:
     Returns:
         str: String representation of the tab.
     """
-    return self.tab
\ No newline at end of file
+    return self.tab
+
+
+def _open_text_output(output):
+  """Returns a context manager giving a text stream for a path or an already open stream.
+
+  Streams are left open on exit; files opened from a path are closed.
+  """
+  if hasattr(output, "write"):
+    return contextlib.nullcontext(output)
+  return open(output, "w")
+
+def _write_system(stream, system):
+  """Writes the lines of a system, given as lists of parts, one line per string."""
+  for parts in system:
+    stream.write("".join(parts) + "\n")
@@ -3,6 +3,7 @@ import numpy as np
 import tuttut.logic.midi_utils as midi_utils
 from pretty_midi import note_number_to_name, note_name_to_number
 from collections import defaultdict
+from collections.abc import Mapping
 
 class Note:
   """Note object."""
@@ -96,6 +97,84 @@ class Tuning:
     
     return min_pitch, max_pitch
 
+NOTE_DTYPE = np.dtype([
+  ("tick", np.int64), ("pitch", np.int16), ("velocity", np.int16), ("end_tick", np.int64), ("instrument", np.int16),
+])
+
+class Timeline(Mapping):
+  """Columnar timeline of the notes and time signatures of a MIDI file, keyed by tick.
+
+  Notes are stored once in a record array sorted by tick, and each chord is a slice of it.
+  The timeline reads like a {tick: {"notes": notes, "time_signature": time_signature}} dict,
+  each event only holding the keys it has.
+  """
+  def __init__(self, notes, time_signatures = ()):
+    """Constructor for the Timeline object.
+
+    Args:
+        notes (np.ndarray): Notes as records of NOTE_DTYPE, sorted by tick
+        time_signatures (list, optional): (tick, pretty_midi.TimeSignature) pairs. Defaults to ().
+    """
+    self.notes = np.asarray(notes, dtype=NOTE_DTYPE).view(np.recarray)
+    self.chord_ticks, self.chord_starts = np.unique(self.notes.tick, return_index=True)
+    self.chord_stops = np.append(self.chord_starts[1:], len(self.notes))
+    self.time_signatures = dict(time_signatures)
+    self.ticks = np.union1d(self.chord_ticks, np.fromiter(self.time_signatures, dtype=np.int64))
+
+  @classmethod
+  def from_midi(cls, midi, instruments, time_signatures):
+    """Builds the timeline of the notes of some instruments of a MIDI file.
+
+    Args:
+        midi (pretty_midi.PrettyMIDI): MIDI object
+        instruments (list): Instruments whose notes are added
+        time_signatures (list): Time signatures of the MIDI
+
+    Returns:
+        Timeline: Timeline of the notes and time signatures
+    """
+    n_notes = sum(len(instrument.notes) for instrument in instruments)
+    notes = np.empty(n_notes, dtype=NOTE_DTYPE)
+    starts, ends = np.empty(n_notes), np.empty(n_notes)
+
+    inote = 0
+    for iinstrument, instrument in enumerate(instruments):
+      stop = inote + len(instrument.notes)
+      starts[inote:stop] = [note.start for note in instrument.notes]
+      ends[inote:stop] = [note.end for note in instrument.notes]
+      notes["pitch"][inote:stop] = [note.pitch for note in instrument.notes]
+      notes["velocity"][inote:stop] = [note.velocity for note in instrument.notes]
+      notes["instrument"][inote:stop] = iinstrument
+      inote = stop
+
+    tempo_table = midi_utils.get_tempo_table(midi)
+    notes["tick"] = midi_utils.times_to_ticks(midi, starts, tempo_table)
+    notes["end_tick"] = midi_utils.times_to_ticks(midi, ends, tempo_table)
+    order = np.lexsort((np.arange(n_notes), starts, notes["instrument"], notes["tick"]))
+
+    time_signature_ticks = midi_utils.times_to_ticks(midi, [ts.time for ts in time_signatures], tempo_table)
+    return cls(notes[order], zip(time_signature_ticks.tolist(), time_signatures))
+
+  def __getitem__(self, tick):
+    """Returns the event at a tick, as a dict holding its "notes" and/or "time_signature"."""
+    event = {}
+    ichord = np.searchsorted(self.chord_ticks, tick)
+    if ichord < len(self.chord_ticks) and self.chord_ticks[ichord] == tick:
+      event["notes"] = self.notes[self.chord_starts[ichord]:self.chord_stops[ichord]]
+    if tick in self.time_signatures:
+      event["time_signature"] = self.time_signatures[tick]
+    if len(event) == 0:
+      raise KeyError(tick)
+    return event
+
+  def __iter__(self):
+    """Iterates over the ticks of the events, in increasing order."""
+    return iter(self.ticks.tolist())
+
+  def __len__(self):
+    """Returns the number of events."""
+    return len(self.ticks)
+
 class Measure: 
   """Measure class."""
   def __init__(self, tab, imeasure, time_signature, measure_start, measure_end):
@@ -113,7 +192,7 @@ class Measure:
     self.measure_start = measure_start
     self.measure_end = measure_end
     
-    self.timeline = midi_utils.get_events_between(self.tab.timeline, measure_start, measure_end)
+    self.timeline = midi_utils.get_events_between(self.tab.timeline, measure_start, measure_end, self.tab.timeline_ticks)
 
   @property
   def duration_ticks(self):